@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# Times decoding a Radarr /movie response of 1k and 10k movies: decoding the body to text first
+# (what response.json() did before), json.loads on the raw bytes, and fastjson with orjson when it is installed.
+# Needs a config.yaml like the bot itself, no Radarr instance is contacted.
+#
+#   python benchmarks/arr_json.py
+
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fastjson  # noqa: E402
+
+SIZES = (1000, 10000)
+REPEAT = 5
+
+
+# A movie as Radarr v3 returns it, with a downloaded file
+def movie(i):
+    return {
+        "id": i,
+        "title": f"Movie {i}",
+        "originalTitle": f"Movie {i}",
+        "originalLanguage": {"id": 1, "name": "English"},
+        "alternateTitles": [{"sourceType": "tmdb", "movieMetadataId": i, "title": f"Alt {i} {k}", "id": i * 10 + k} for k in range(3)],
+        "sortTitle": f"movie {i}",
+        "sizeOnDisk": i * 7919 * 1000003,
+        "status": "released",
+        "overview": "A long synopsis of the movie. " * 15,
+        "inCinemas": "2019-04-24T00:00:00Z",
+        "physicalRelease": "2019-08-13T00:00:00Z",
+        "digitalRelease": "2019-07-30T00:00:00Z",
+        "images": [
+            {"coverType": coverType, "url": f"/MediaCover/{i}/{coverType}.jpg", "remoteUrl": f"https://image.tmdb.org/t/p/original/{coverType}{i}.jpg"}
+            for coverType in ("poster", "fanart")
+        ],
+        "website": "https://example.com",
+        "year": 1950 + i % 70,
+        "hasFile": True,
+        "youTubeTrailerId": "abcdefg",
+        "studio": "Studio",
+        "path": f"/movies/Movie {i} (2019)",
+        "qualityProfileId": 1,
+        "monitored": i % 3 != 0,
+        "minimumAvailability": "released",
+        "isAvailable": True,
+        "runtime": 120,
+        "cleanTitle": f"movie{i}",
+        "imdbId": f"tt{i:07d}",
+        "tmdbId": 100000 + i,
+        "titleSlug": str(100000 + i),
+        "certification": "PG-13",
+        "genres": ["Action", "Adventure", "Drama"],
+        "tags": [1, 2],
+        "added": "2020-01-01T00:00:00Z",
+        "ratings": {"imdb": {"votes": 1000, "value": 7.5, "type": "user"}, "tmdb": {"votes": 900, "value": 7.1, "type": "user"}},
+        "movieFile": {
+            "id": i,
+            "movieId": i,
+            "relativePath": f"Movie {i}.mkv",
+            "size": 10 ** 10,
+            "dateAdded": "2020-01-01T00:00:00Z",
+            "quality": {"quality": {"id": 7, "name": "Bluray-1080p", "source": "bluray", "resolution": 1080}, "revision": {"version": 1, "real": 0}},
+            "mediaInfo": {"audioChannels": 5.1, "audioCodec": "DTS", "videoCodec": "x264", "resolution": "1920x1080", "runTime": "2:00:00"},
+        },
+        "popularity": 12.3,
+    }
+
+
+def best(callback):
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        callback()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    print(f"fastjson backend: {fastjson.BACKEND}")
+    print(f"{'movies':>7} {'raw/gzip size':>16} {'text':>10} {'bytes':>10} {'fastjson':>10}")
+    for size in SIZES:
+        body = json.dumps([movie(i) for i in range(size)]).encode("utf-8")
+        compressed = len(gzip.compress(body))
+
+        text = best(lambda: json.loads(body.decode("utf-8")))
+        raw = best(lambda: json.loads(body))
+        fast = best(lambda: fastjson.loads(body))
+        sizes = f"{len(body) / 1e6:.1f}/{compressed / 1e6:.2f} MB"
+        print(f"{size:>7} {sizes:>16} {text:>7.0f} ms {raw:>7.0f} ms {fast:>7.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# Times /allMovies and /allSeries on libraries of 1k, 10k and 100k items: the first page (which sorts
+# the library index), turning a page and exporting the whole library. Formatting every item is timed too,
+# that is what listing the whole library in chat messages used to cost.
+# Needs a config.yaml like the bot itself, no Radarr or Sonarr instance is contacted.
+#
+#   python benchmarks/library_page.py
+
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import all as allMedia  # noqa: E402
+import export  # noqa: E402
+import library  # noqa: E402
+from commons import formatListItem  # noqa: E402
+
+SIZES = (1000, 10000, 100000)
+REPEAT = 5
+STATUSES = ("continuing", "ended", "upcoming", "deleted")
+
+
+def buildIndex(size):
+    client = types.SimpleNamespace(app="sonarr", label=f"bench{size}")
+    index = library.getIndex(client)
+    index.items = {
+        1000 + i: library.MediaItem(1000 + i, i, f"Some Series Title {size - i}", 1990 + i % 35, i % 2 == 0, STATUSES[i % 4])
+        for i in range(size)
+    }
+    index.updated = time.monotonic()
+    return client, index
+
+
+def best(callback, before=None):
+    times = []
+    for _ in range(REPEAT):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        callback()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    print(f"{'items':>7} {'first page':>12} {'turn page':>12} {'export csv.gz':>15} {'format all':>12}")
+    for size in SIZES:
+        client, index = buildIndex(size)
+        pages = len(index.items) // 25
+
+        def resetSort():
+            index._sorted = None
+
+        firstPage = best(lambda: allMedia.libraryPage(client, 0), before=resetSort)
+        turnPage = best(lambda: allMedia.libraryPage(client, pages // 2))
+        exportAll = best(lambda: export.writeExport(index.sortedItems(), "csvgz"))
+        formatAll = best(lambda: "".join(formatListItem(item) for item in index.sortedItems()))
+        print(f"{size:>7} {firstPage:>9.2f} ms {turnPage:>9.2f} ms {exportAll:>12.2f} ms {formatAll:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,29 @@ import logging
 import re
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-import telegram
 from telegram.constants import ParseMode
+from telegram.helpers import escape_markdown
 from telegram.ext import (CallbackQueryHandler, CommandHandler,
                           ConversationHandler, filters, MessageHandler,
-                          ContextTypes, Application)
+                          ContextTypes, Application, ExtBot)
 from telegram.warnings import PTBUserWarning
 
 from commons import (checkAllowed, checkId, authentication,
-                    format_bytes, getAuthChats, getService, clearUserData, 
-                    checkNotificationSubscribed, generateProfileName)
+                    format_bytes, getAuthChats, getService, getArrClient, clearUserData, 
+                    checkNotificationSubscribed, generateProfileName, getClientService,
+                    getServiceName, searchAllInstances, ALL_INSTANCES)
 import logger
+import arrclient
+from arrclient import buildClients, closeClients, getClients
+import authstore
+import cache
+import library
+import metrics
+import outbox
+import statestore
+import tracing
+from scheduler import ChatUpdateProcessor
 import radarr as radarr
-import sonarr as sonarr
 import delete as delete
 import all as all
 from config import checkConfigValues, config, checkConfig
@@ -51,27 +61,70 @@ async def post_init(application: Application) -> None:
         (config["entrypointSabnzbd"].lower(), i18n.t("addarr.CommandDescriptions.Sabnzbd")),
         (config["entrypointqBittorrent"].lower(), i18n.t("addarr.CommandDescriptions.qBittorrent")),
         (config["entrypointNotify"].lower(), i18n.t("addarr.CommandDescriptions.Notify")),
+        (config["entrypointFlushCache"].lower(), i18n.t("addarr.CommandDescriptions.FlushCache")),
     ]
 
     await application.bot.set_my_commands(commands)
+    buildClients()
+    library.startRefresh()
+    await metrics.start()
+
+
+async def post_shutdown(application: Application) -> None:
+    await metrics.stop()
+    library.stopRefresh()
+    await closeClients()
+    statestore.close()
+
+applicationBuilder = (
+    Application.builder().token(config["telegram"]["token"])
+    .post_init(post_init).post_shutdown(post_shutdown)
+    .rate_limiter(outbox.limiter)
+)
+if config.get("concurrentUpdates", 1) > 1:
+    # Different chats are handled in parallel, updates of one chat stay in order
+    applicationBuilder = applicationBuilder.concurrent_updates(ChatUpdateProcessor(config["concurrentUpdates"]))
+application = applicationBuilder.build()
+
+# Instances that can't be reached end up here, the user is told which one. Anything else is logged
+async def handleError(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    error = context.error
+    if not isinstance(error, arrclient.InstanceUnavailable):
+        logger.error("Exception while handling an update", exc_info=error)
+        return
+    logger.warning(f"{error} ({error.__cause__!r})" if error.__cause__ else str(error))
+    if isinstance(update, Update) and update.effective_chat:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=i18n.t("addarr.Messages.InstanceUnavailable", instance=error.client.label),
+        )
+
+
+# Replace the callback of every handler, including the steps of conversations, by wrap(callback)
+def wrapCallbacks(handlers, wrap):
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            wrapCallbacks(handler.entry_points, wrap)
+            for state in handler.states.values():
+                wrapCallbacks(state, wrap)
+            wrapCallbacks(handler.fallbacks, wrap)
+        else:
+            handler.callback = wrap(handler.callback)
 
-application = Application.builder().token(config["telegram"]["token"]).post_init(post_init).build()
 
 async def startCheck():
-    bot = telegram.Bot(token=config["telegram"]["token"])
+    bot = ExtBot(token=config["telegram"]["token"], rate_limiter=outbox.limiter)
     missingConfig = checkConfig()
     wrongValues = checkConfigValues()
     check=True
     if missingConfig: #empty list is False
         check = False
         logger.error(i18n.t("addarr.Messages.MissingConfig", missingKeys=f"{missingConfig}"[1:-1]))
-        for chat in getAuthChats():
-            await bot.send_message(chat_id=chat, text=i18n.t("addarr.Messages.MissingConfig", missingKeys=f"{missingConfig}"[1:-1]))
+        await outbox.broadcast(bot, getAuthChats(), i18n.t("addarr.Messages.MissingConfig", missingKeys=f"{missingConfig}"[1:-1]))
     if wrongValues:
         check=False
         logger.error(i18n.t("addarr.Messages.ConfigError", wrongValues=f"{wrongValues}"[1:-1]))
-        for chat in getAuthChats():
-            await bot.send_message(chat_id=chat, text=i18n.t("addarr.Messages.ConfigError", wrongValues=f"{wrongValues}"[1:-1]))
+        await outbox.broadcast(bot, getAuthChats(), i18n.t("addarr.Messages.ConfigError", wrongValues=f"{wrongValues}"[1:-1]))
     return check
 
 
@@ -173,6 +226,8 @@ def main():
                     delete.startDelete
                 ),
                 CallbackQueryHandler(delete.startDelete, pattern=f'({i18n.t("addarr.General.New")})'),  
+                CallbackQueryHandler(delete.prevDeleteOption, pattern=f'(?i)^({i18n.t("addarr.General.PreviousResult")})$'),
+                CallbackQueryHandler(delete.nextDeleteOption, pattern=f'(?i)^({i18n.t("addarr.General.NextResult")})$'),
             ],
         },
         fallbacks=[
@@ -364,14 +419,38 @@ def main():
     application.add_handler(notification_handler_text)
 
     application.add_handler(listAllMediaHandler)
+    application.add_handler(CallbackQueryHandler(all.turnPage, pattern=r"^allPage="))
+    application.add_handler(CallbackQueryHandler(all.exportLibrary, pattern=r"^allExport="))
     application.add_handler(addMedia_handler)
     application.add_handler(deleteMedia_handler)
 
     help_handler_command = CommandHandler(config["entrypointHelp"], help)
     application.add_handler(help_handler_command)
 
+    flushCache_handler_command = CommandHandler(config["entrypointFlushCache"], flushCache)
+    application.add_handler(flushCache_handler_command)
+
+    application.add_error_handler(handleError)
+    # Tracing wraps the metrics, so the handler span includes everything the step does
+    if config["metrics"].get("enable"):
+        wrapCallbacks(application.handlers[0], metrics.timed)
+    if config["tracing"].get("enable"):
+        wrapCallbacks(application.handlers[0], tracing.traced)
+
     logger.info(i18n.t("addarr.Messages.StartChatting"))
-    application.run_polling()
+    webhook = config["webhook"]
+    if webhook.get("enable"):
+        # Telegram pushes updates to the local listener, requests without the secret token are rejected
+        logger.info(f"Listening for webhook updates on {webhook['listen']}:{webhook['port']}/{webhook['path']}")
+        application.run_webhook(
+            listen=webhook["listen"],
+            port=int(webhook["port"]),
+            url_path=str(webhook["path"]),
+            webhook_url=webhook["url"],
+            secret_token=webhook.get("secretToken") or None,
+        )
+    else:
+        application.run_polling()
 
 
 async def stop(update : Update, context: ContextTypes.DEFAULT_TYPE):
@@ -600,6 +679,12 @@ async def storeMediaType(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 callback_data=f"instance={label}"
                 ),
             ]]
+        keyboard += [[
+            InlineKeyboardButton(
+            '\U0001F310 ' + i18n.t("addarr.General.AllInstances"),
+            callback_data=f"instance={ALL_INSTANCES}"
+            ),
+        ]]
 
         markup = InlineKeyboardMarkup(keyboard)
 
@@ -701,6 +786,12 @@ async def storeTitle(update : Update, context: ContextTypes.DEFAULT_TYPE):
                 callback_data=f"instance={label}"
                 ),
             ]]
+        keyboard += [[
+            InlineKeyboardButton(
+            '\U0001F310 ' + i18n.t("addarr.General.AllInstances"),
+            callback_data=f"instance={ALL_INSTANCES}"
+            ),
+        ]]
 
         markup = InlineKeyboardMarkup(keyboard)
 
@@ -735,6 +826,11 @@ async def storeInstance(update : Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         return MEDIA_AUTHENTICATED
     
+    if context.user_data.get("instance") == ALL_INSTANCES:
+        # A result of the search on all instances was picked, this is the instance to add it to
+        useTargetInstance(context, reply.replace("instance=", "", 1))
+        return await storeSelection(update, context)
+
     if not context.user_data.get("instance"):
         if reply.startswith("instance="):
             label = reply.replace("instance=", "", 1)
@@ -745,16 +841,19 @@ async def storeInstance(update : Update, context: ContextTypes.DEFAULT_TYPE):
         logger.debug("Instance set from previous function")
 
 
-    instance = context.user_data["instance"]
     title = context.user_data["title"]
     choice = context.user_data["choice"]
     position = context.user_data["position"] = 0
 
     service = getService(context)
-    service.setInstance(instance)
-    searchResult = service.search(title)
+    if context.user_data["instance"] == ALL_INSTANCES:
+        context.user_data["output"] = await searchAllInstances(getServiceName(context), title)
+    else:
+        client = getArrClient(context)
+        searchResult = await service.search(client, title)
+        context.user_data["output"] = service.giveTitles(searchResult) if searchResult else []
 
-    if not searchResult:
+    if not context.user_data["output"]:
         logger.warning("No results found.")
         await context.bot.send_message( 
             chat_id=update.effective_message.chat_id, 
@@ -763,9 +862,8 @@ async def storeInstance(update : Update, context: ContextTypes.DEFAULT_TYPE):
         clearUserData(context)
         return ConversationHandler.END
 
-    context.user_data["output"] = service.giveTitles(searchResult)
-    message=i18n.t("addarr.SearchResults", count=len(searchResult))
-    message += f"\n\n*{context.user_data['output'][position]['title']} ({context.user_data['output'][position]['year']})*"
+    message=i18n.t("addarr.SearchResults", count=len(context.user_data["output"]))
+    message += describeResult(context, position)
     
     if "update_msg" in context.user_data:
         await context.bot.edit_message_text(
@@ -851,6 +949,69 @@ async def storeInstance(update : Update, context: ContextTypes.DEFAULT_TYPE):
     return GIVE_OPTION
 
 
+def describeResult(context, position):
+    result = context.user_data["output"][position]
+    message = f"\n\n*{result['title']} ({result['year']})*"
+    if "inInstances" in result:
+        # Availability across instances, only known for a search on all instances
+        if result["inInstances"]:
+            labels = ", ".join(escape_markdown(label) for label in result["inInstances"])
+            message += "\n" + i18n.t("addarr.Messages.InInstances", instances=labels)
+        else:
+            message += "\n" + i18n.t("addarr.Messages.InNoInstance")
+    return message
+
+
+def useTargetInstance(context, label):
+    client = arrclient.getClient(getServiceName(context), label)
+    context.user_data["instance"] = client.label
+    result = context.user_data["output"][context.user_data["position"]]
+    # Use the lookup record of the chosen instance, or look it up again when that instance did not return it
+    result["lookup"] = result["lookups"].get(client.label)
+
+
+async def selectTargetInstance(update : Update, context: ContextTypes.DEFAULT_TYPE):
+    result = context.user_data["output"][context.user_data["position"]]
+    labels = [client.label for client in getClients(getServiceName(context)) if client.label not in result["inInstances"]]
+
+    if not labels:
+        if context.user_data["choice"].lower() == i18n.t("addarr.General.Movie").lower():
+            message=i18n.t("addarr.Messages.Exist", subjectWithArticle=i18n.t("addarr.General.MovieWithArticle"))
+        else:
+            message=i18n.t("addarr.Messages.Exist", subjectWithArticle=i18n.t("addarr.General.SeriesWithArticle"))
+        await context.bot.edit_message_text(
+            message_id=context.user_data["update_msg"],
+            chat_id=update.effective_message.chat_id,
+            text=message,
+        )
+        clearUserData(context)
+        return ConversationHandler.END
+
+    if len(labels) == 1:
+        # Only one instance is missing it, so use that one
+        logger.debug(f"Only {labels[0]} does not have this yet, so proceeding with that one...")
+        useTargetInstance(context, labels[0])
+        return await storeSelection(update, context)
+
+    keyboard = []
+    for label in labels:
+        keyboard += [[
+            InlineKeyboardButton(
+            label,
+            callback_data=f"instance={label}"
+            ),
+        ]]
+    markup = InlineKeyboardMarkup(keyboard)
+
+    await context.bot.edit_message_text(
+        message_id=context.user_data["update_msg"],
+        chat_id=update.effective_message.chat_id,
+        text=i18n.t("addarr.General.SelectAnInstance"),
+        reply_markup=markup,
+    )
+    return GIVE_INSTANCE
+
+
 async def nextOption(update: Update, context: ContextTypes.DEFAULT_TYPE):
     position = min(context.user_data["position"] + 1, len(context.user_data["output"]) - 1)
     context.user_data["position"] = position
@@ -858,7 +1019,7 @@ async def nextOption(update: Update, context: ContextTypes.DEFAULT_TYPE):
     choice = context.user_data["choice"]    
 
     message=i18n.t("addarr.SearchResults", count=len(searchResult))
-    message += f"\n\n*{context.user_data['output'][position]['title']} ({context.user_data['output'][position]['year']})*"
+    message += describeResult(context, position)
 
     await context.bot.edit_message_text(
         message_id=context.user_data["title_update_msg"],
@@ -949,7 +1110,7 @@ async def prevOption(update: Update, context: ContextTypes.DEFAULT_TYPE):
     choice = context.user_data["choice"]    
 
     message=i18n.t("addarr.SearchResults", count=len(searchResult))
-    message += f"\n\n*{context.user_data['output'][position]['title']} ({context.user_data['output'][position]['year']})*"
+    message += describeResult(context, position)
     
     await context.bot.edit_message_text(
         message_id=context.user_data["title_update_msg"],
@@ -1039,11 +1200,15 @@ async def storeSelection(update : Update, context: ContextTypes.DEFAULT_TYPE):
     # variables in context.user_data will keep track of what the user selected based on position and stuff
     # so we dont really have to "store" anything here this time
 
+    if context.user_data.get("instance") == ALL_INSTANCES:
+        # Searched on all instances, so first ask where to add it
+        return await selectTargetInstance(update, context)
+
     service = getService(context)
-    service.setInstance(context.user_data["instance"])
+    client = getArrClient(context)
     
-    paths = service.getRootFolders()
-    excluded_root_folders = service.config.get("excludedRootFolders", [])
+    paths = await service.getRootFolders(client)
+    excluded_root_folders = client.config.get("excludedRootFolders", [])
     paths = [p for p in paths if p["path"] not in excluded_root_folders]
     logger.debug(f"Excluded root folders: {excluded_root_folders}")
 
@@ -1057,7 +1222,7 @@ async def storeSelection(update : Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = []
     for p in paths:
         pathtxt = p['path']
-        if service.config.get("narrowRootFolderNames"):
+        if client.config.get("narrowRootFolderNames"):
             pathlst = p['path'].split("/")
             pathtxt = pathlst[len(pathlst)-1]
         free = format_bytes(p['freeSpace'])
@@ -1096,10 +1261,10 @@ async def storePath(update : Update, context: ContextTypes.DEFAULT_TYPE):
             return await storeSelection(update, context)  # go back to previous step
     
     service = getService(context)
-    service.setInstance(context.user_data["instance"])
+    client = getArrClient(context)
 
-    excluded_quality_profiles = service.config.get("excludedQualityProfiles", [])
-    qualityProfiles = service.getQualityProfiles()
+    excluded_quality_profiles = client.config.get("excludedQualityProfiles", [])
+    qualityProfiles = await service.getQualityProfiles(client)
     qualityProfiles = [q for q in qualityProfiles if q["name"] not in excluded_quality_profiles]
     logger.debug(f"Excluded quality profiles: {excluded_quality_profiles}")
 
@@ -1147,14 +1312,14 @@ async def storeQualityProfile(update : Update, context: ContextTypes.DEFAULT_TYP
             return storePath(update, context) # go back to previous step
   
     service = getService(context)
-    service.setInstance(context.user_data["instance"])
+    client = getArrClient(context)
 
     if service == radarr:
         return await addMedia(update, context)
         
     position = context.user_data["position"]
     idnumber = context.user_data["output"][position]["id"]
-    seasons = service.getSeasons(idnumber)
+    seasons = await service.getSeasons(client, idnumber, context.user_data["output"][position].get("lookup"))
     seasonNumbers = [s["seasonNumber"] for s in seasons]
     context.user_data["seasons"] = seasonNumbers
     selectedSeasons = []
@@ -1263,13 +1428,17 @@ async def storeSeasons(update : Update, context: ContextTypes.DEFAULT_TYPE):
             return await storeSeasons(update, context) 
 
 
+# Not registered as a handler, it is called by the last step of the conversation
+@tracing.traced
+@metrics.timed
 async def addMedia(update : Update, context: ContextTypes.DEFAULT_TYPE):
     position = context.user_data["position"]
     choice = context.user_data["choice"]
     idnumber = context.user_data["output"][position]["id"]
+    lookup = context.user_data["output"][position].get("lookup")
     path = context.user_data["path"]
     service = getService(context)
-    service.setInstance(context.user_data["instance"])
+    client = getArrClient(context)
 
     if choice.lower() == i18n.t("addarr.General.Series").lower():
         seasons = context.user_data["seasons"]
@@ -1292,22 +1461,23 @@ async def addMedia(update : Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Process the tags that will be added
     tags = []
-    service_Config = service.getInstance()
+    service_Config = client.config
 
     #create tag that will be used: userid
     
     if service_Config.get("addRequesterIdTag"):
         userTag = str(update.effective_message.chat.id)
-        if service.tagExists(userTag) != -1:
-            tags = [service.tagExists(userTag)]
+        userTagId = await service.tagExists(client, userTag)
+        if userTagId != -1:
+            tags = [userTagId]
             logger.debug(f'The tag {userTag} already exists. Using existing tag for user')
         else:
             logger.debug(f'The tag {userTag} does not exists. Creating new tag for user')
-            newTag = service.createTag(userTag)
+            newTag = await service.createTag(client, userTag)
             if newTag >=0: 
                 tags = [newTag]
             else:
-                instace_name = service.getInstance()
+                instace_name = client.label
                 logger.debug(f'Create user tag FAILED in {instace_name}: {userTag}')
     else:
         logger.debug("tagging not included")
@@ -1315,17 +1485,21 @@ async def addMedia(update : Update, context: ContextTypes.DEFAULT_TYPE):
     if not tags:
         logger.debug(f'Adding default tags')
         default_tags = service_Config.get("defaultTags", [])
+        existingTags = {str(t["label"]): t["id"] for t in await service.getTags(client)}
         for tag in default_tags:
-            if str(tag) not in [str(t["label"]) for t in service.getTags()]:
-                newTag = service.createTag(str(tag))
+            if str(tag).lower() in existingTags:
+                tags.append(existingTags[str(tag).lower()])
+            else:
+                newTag = await service.createTag(client, str(tag))
                 tags.append(newTag)
     
-    if not service.inLibrary(idnumber):
+    if not await service.inLibrary(client, idnumber):
         if choice.lower() == i18n.t("addarr.General.Movie").lower():
-            added = service.addToLibrary(idnumber, path, qualityProfile, tags)
+            added = await service.addToLibrary(client, idnumber, path, qualityProfile, tags, lookup=lookup)
         else:
-            added = service.addToLibrary(idnumber, path, qualityProfile, tags, seasonsSelected)
+            added = await service.addToLibrary(client, idnumber, path, qualityProfile, tags, seasonsSelected, lookup=lookup)
         
+        logAddRequest(update, context, client, "added" if added else "failed")
         if added:
             if choice.lower() == i18n.t("addarr.General.Movie").lower():
                 message=i18n.t("addarr.Messages.AddSuccess", subjectWithArticle=i18n.t("addarr.General.MovieWithArticle"))
@@ -1369,6 +1543,7 @@ async def addMedia(update : Update, context: ContextTypes.DEFAULT_TYPE):
             clearUserData(context)
             return ConversationHandler.END
     else:
+        logAddRequest(update, context, client, "exists")
         if choice.lower() == i18n.t("addarr.General.Movie").lower():
             message=i18n.t("addarr.Messages.Exist", subjectWithArticle=i18n.t("addarr.General.MovieWithArticle"))
         else:
@@ -1391,6 +1566,16 @@ async def addMedia(update : Update, context: ContextTypes.DEFAULT_TYPE):
         clearUserData(context)
         return ConversationHandler.END
 
+def logAddRequest(update, context, client, result):
+    media = context.user_data["output"][context.user_data["position"]]
+    # addMedia runs from a callback query, so effective_message is the bot's own message
+    user = update.effective_user
+    statestore.logRequest(
+        update.effective_message.chat_id, user.username if user else None,
+        client.app, client.label, media["id"], media["title"], result,
+    )
+
+
 async def addNotificationChannel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if config.get("enableAllowlist") and not checkAllowed(update,"regular"):
         #When using this mode, bot will remain silent if user is not in the allowlist.txt
@@ -1410,36 +1595,36 @@ async def addNotificationChannel(update: Update, context: ContextTypes.DEFAULT_T
         text=i18n.t("addarr.Notifications.CreatingProfiles")
     )
     # add notifications to each instance. check each instance before adding. use chatID as profileName
-    # check radarr and sonarr as well
-    radarr_instances = config['radarr']['instances']
-    sonarr_instances = config['sonarr']['instances']
-
+    # all radarr and sonarr instances are provisioned at the same time
     chatId = update.effective_message.chat_id
-
-    for instance in radarr_instances:
-        radarr.setInstance(instance["label"])
-        if not radarr.notificationProfileExist(chatId):
-            # create new
-            profileName = await generateProfileName(context, chatId)
-            status = radarr.createNotificationProfile(profileName, update.effective_chat.id)
-            if status:
-                label = instance["label"]
-                logger.info(f"Successfully created notification profiles for Radarr instance {label}")
-    
-        
-    for instance in sonarr_instances:
-        sonarr.setInstance(instance["label"])
-        if not sonarr.notificationProfileExist(chatId):
-            # create new
-            profileName = await generateProfileName(context, chatId)
-            status = sonarr.createNotificationProfile(profileName, update.effective_chat.id)
-            if status:
-                label = instance["label"]
-                logger.info(f"Successfully created notification profiles for Sonarr instance {label}")
-
+    profileName = await generateProfileName(context, chatId)
+
+    async def provision(client):
+        service = getClientService(client)
+        if await service.notificationProfileExist(client, chatId):
+            return "InstanceExists"
+        if await service.createNotificationProfile(client, profileName, update.effective_chat.id):
+            logger.info(f"Successfully created notification profiles for {client.app} instance {client.label}")
+            return "InstanceCreated"
+        return "InstanceFailed"
+
+    clients = getClients()
+    results = await asyncio.gather(*[provision(client) for client in clients], return_exceptions=True)
+
+    report = []
+    for client, result in zip(clients, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Creating notification profile on {client.app} instance {client.label} failed: {result}")
+            result = "InstanceFailed"
+        report.append(i18n.t(f"addarr.Notifications.{result}", instance=client.label))
+    subscribed = any(result in ("InstanceCreated", "InstanceExists") for result in results)
+    if subscribed:
+        authstore.notifications.add(chatId, profileName)
+
+    summary = "ProfileCreated" if subscribed else "ProfileFailed"
     await context.bot.send_message(
         chat_id=update.effective_message.chat_id,
-        text=i18n.t("addarr.Notifications.ProfileCreated"),
+        text=i18n.t(f"addarr.Notifications.{summary}") + "\n\n" + "\n".join(report),
     )
 
 async def help(update : Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1472,6 +1657,32 @@ async def help(update : Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+async def flushCache(update : Update, context: ContextTypes.DEFAULT_TYPE):
+    if config.get("enableAllowlist") and not checkAllowed(update,"regular"):
+        #When using this mode, bot will remain silent if user is not in the allowlist.txt
+        logger.info("Allowlist is enabled, but userID isn't added into 'allowlist.txt'. So bot stays silent")
+        return ConversationHandler.END
+
+    if not checkId(update):
+        await context.bot.send_message(
+            chat_id=update.effective_message.chat_id, text=i18n.t("addarr.Authorization.Authorize")
+        )
+        return ConversationHandler.END
+
+    if not checkAllowed(update, "admin") and config.get("enableAdmin"):
+        await context.bot.send_message(
+            chat_id=update.effective_message.chat_id,
+            text=i18n.t("addarr.Authorization.NotAdmin"),
+        )
+        return ConversationHandler.END
+
+    cache.flushAll()
+    await context.bot.send_message(
+        chat_id=update.effective_message.chat_id,
+        text=i18n.t("addarr.Messages.CacheFlushed"),
+    )
+    return ConversationHandler.END
+
 
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
@@ -1,9 +1,16 @@
 from telegram.ext import ConversationHandler
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.constants import MessageLimit
+import asyncio
 import logging
+import math
 import logger
 
-from commons import authentication, checkAllowed, checkId, format_long_list_message, getService
+import arrclient
+import export
+import library
+
+from commons import authentication, checkAllowed, checkId, formatListItem, getArrClient
 from config import config
 from translations import i18n
 
@@ -13,6 +20,9 @@ logger = logger.getLogger("addarr.radarr", logLevel, config.get("logToConsole",
 
 LS_GIVE_MOVIE_INSTANCE, LS_GIVE_SERIE_INSTANCE, GG_STATE = range(3)
 
+# Larger pages would not fit in one message, even with every title shortened
+MAX_PAGE_SIZE = 50
+
 
 async def startAllSeries(update, context):
     # check and authenticate user
@@ -40,11 +50,9 @@ async def sendAll(update, context):
         reply = update.callback_query.data.replace("instance=", "", 1)
         context.user_data["instance"] = reply
 
-    instance = context.user_data["instance"]
-    service = getService(context)
-    service.setInstance(instance)
+    client = getArrClient(context)
 
-    if service.config.get("adminRestrictions") and not checkAllowed(update, "admin"):
+    if client.config.get("adminRestrictions") and not checkAllowed(update, "admin"):
         await context.bot.send_message(
             chat_id=update.effective_message.chat_id,
             text=i18n.t("addarr.Authorization.NotAdmin"),
@@ -64,22 +72,105 @@ async def sendAll(update, context):
             text=i18n.t("addarr.Messages.LoadingAll"),
         )
 
-    # show all series
-    result = service.getAllMedia()
-    content = format_long_list_message(result)
+    # show the first page, the other pages are served from the same library index
+    await library.getIndex(client).ensureLoaded()
+    text, markup = libraryPage(client, 0)
+    await context.bot.edit_message_text(
+        message_id=context.user_data["update_msg"],
+        chat_id=update.effective_message.chat_id,
+        text=text,
+        reply_markup=markup,
+    )
+    return ConversationHandler.END
 
-    if isinstance(content, str):
-        await context.bot.send_message(
-            chat_id=update.effective_message.chat_id,
-            text=content,
+
+def shortenTitle(item, length):
+    title = str(item["title"])
+    if len(title) <= length:
+        return item
+    return {
+        "title": title[:length - 1] + "\u2026",
+        "year": item["year"],
+        "status": item["status"],
+        "monitored": item["monitored"],
+    }
+
+
+def libraryPage(client, page):
+    items = library.getIndex(client).sortedItems()
+    pageSize = min(max(1, config.get("allPageSize", 25)), MAX_PAGE_SIZE)
+    pages = max(1, math.ceil(len(items) / pageSize))
+    page = min(max(page, 0), pages - 1)
+
+    text = i18n.t("addarr.Messages.LibraryPage", instance=client.label, count=len(items), page=page + 1, pages=pages)
+    pageItems = items[page * pageSize:(page + 1) * pageSize]
+    listing = "".join(formatListItem(item) for item in pageItems)
+    # Long titles can take a page past Telegram's message limit, then the titles are shortened until it fits
+    space = MessageLimit.MAX_TEXT_LENGTH - len(text) - 2
+    if len(listing) > space:
+        titles = sum(len(str(item["title"])) for item in pageItems)
+        titleLength = max(2, (space - (len(listing) - titles)) // len(pageItems))
+        listing = "".join(formatListItem(shortenTitle(item, titleLength)) for item in pageItems)
+    text += "\n\n" + listing
+
+    # The buttons carry app, page and instance, so a page can be turned at any time without conversation state
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(
+            '\U000023EE ' + i18n.t("addarr.General.PreviousResult"),
+            callback_data=f"allPage={client.app}:{page - 1}:{client.label}"
+        ))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton(
+            '\U000023ED ' + i18n.t("addarr.General.NextResult"),
+            callback_data=f"allPage={client.app}:{page + 1}:{client.label}"
+        ))
+    keyboard = [buttons] if buttons else []
+    # The whole library as one file instead of pages
+    keyboard.append([
+        InlineKeyboardButton(
+            '\U0001F4E5 ' + extension.upper(),
+            callback_data=f"allExport={client.app}:{exportFormat}:{client.label}"
         )
-    else:
-        for subString in content:
-            await context.bot.send_message(
-                chat_id=update.effective_message.chat_id,
-                text=subString,
-            )
-    return ConversationHandler.END
+        for exportFormat, extension in export.EXPORT_FORMATS.items()
+    ])
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+# The instance named by a button of an older message, None if it has been renamed or removed since
+def buttonClient(app, label):
+    try:
+        return arrclient.getClient(app, label)
+    except ValueError as e:
+        logger.info(f"Ignoring button of an older message: {e}")
+        return None
+
+
+def browseAllowed(update, client):
+    if config.get("enableAllowlist") and not checkAllowed(update, "regular"):
+        logger.info("Allowlist is enabled, but userID isn't added into 'allowlist.txt'. So bot stays silent")
+        return False
+    if not checkId(update):
+        return False
+    return not (client.config.get("adminRestrictions") and not checkAllowed(update, "admin"))
+
+
+async def turnPage(update, context):
+    await update.callback_query.answer()
+    app, page, label = update.callback_query.data.replace("allPage=", "", 1).split(":", 2)
+    client = buttonClient(app, label)
+    if client is None or not browseAllowed(update, client):
+        return
+
+    # After a restart the buttons of an older message still work, the index is loaded on demand
+    await library.getIndex(client).ensureLoaded()
+    text, markup = libraryPage(client, int(page))
+    await context.bot.edit_message_text(
+        message_id=update.callback_query.message.message_id,
+        chat_id=update.effective_message.chat_id,
+        text=text,
+        reply_markup=markup,
+    )
 
 
 async def startAllMovies(update, context):
@@ -128,3 +219,29 @@ async def selectInstance(update : Update, context):
     )
     context.user_data["update_msg"] = msg.message_id
     return
+
+
+async def exportLibrary(update, context):
+    await update.callback_query.answer()
+    app, exportFormat, label = update.callback_query.data.replace("allExport=", "", 1).split(":", 2)
+    client = buttonClient(app, label)
+    if client is None or not browseAllowed(update, client) or exportFormat not in export.EXPORT_FORMATS:
+        return
+
+    # Exported from the library index, so the library is not downloaded again
+    index = library.getIndex(client)
+    await index.ensureLoaded()
+    if index.updated is None:
+        await context.bot.send_message(
+            chat_id=update.effective_message.chat_id,
+            text=i18n.t("addarr.Messages.ExportFailed"),
+        )
+        return
+
+    # Writing the file happens off the event loop, other chats are not held up by a big library
+    document = await asyncio.to_thread(export.writeExport, index.sortedItems(), exportFormat)
+    await context.bot.send_document(
+        chat_id=update.effective_message.chat_id,
+        document=document,
+        filename=f"{client.label}.{export.EXPORT_FORMATS[exportFormat]}",
+    )
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+import asyncio
+import contextlib
+import logging
+import random
+import time
+
+import httpx
+
+import fastjson
+import jsonstream
+import logger
+import metrics
+import tracing
+from config import config
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.arrclient", logLevel, config.get("logToConsole", False))
+
+# One pooled client per (app, label), so keep-alive connections are reused across handlers
+_clients = {}
+
+# Gateway errors are retried like connection errors, and count towards the circuit breaker
+RETRY_STATUSES = {502, 503, 504}
+
+
+# Raised when an instance could not be reached (after retrying, for GETs),
+# and instead of sending a request at all while its circuit breaker is open
+class InstanceUnavailable(Exception):
+    def __init__(self, client):
+        self.client = client
+        super().__init__(f"{client.app} instance {client.label} is unavailable")
+
+
+# Raised when a request waited longer than the queue timeout for a free slot of its instance
+class InstanceBusy(InstanceUnavailable):
+    def __init__(self, client):
+        self.client = client
+        Exception.__init__(self, f"{client.app} instance {client.label} is busy")
+
+
+# Limits the requests that run against one instance at the same time. Further requests queue up
+# for a free slot, so a burst of users can't overload a small instance or starve the others
+class Bulkhead:
+    def __init__(self, client, limit, queueTimeout):
+        self.client = client
+        self.limit = limit
+        self.queueTimeout = queueTimeout
+        self._semaphore = asyncio.Semaphore(limit) if limit else None
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            yield
+            return
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queueTimeout or None)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            logger.warning(
+                f"Request to {self.client.app} instance {self.client.label} waited more than {self.queueTimeout}s "
+                f"for one of its {self.limit} slots, giving up"
+            )
+            raise InstanceBusy(self.client) from None
+        finally:
+            self.queued -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+
+# Opens after `threshold` consecutive failed requests to an instance. While open, requests fail at once
+# instead of waiting for their timeout, and the instance is probed in the background until it answers again.
+class CircuitBreaker:
+    def __init__(self, client, threshold, probeInterval):
+        self.client = client
+        self.threshold = threshold
+        self.probeInterval = probeInterval
+        self.failures = 0
+        self.isOpen = False
+        self._probeTask = None
+
+    def check(self):
+        if self.isOpen:
+            raise InstanceUnavailable(self.client)
+
+    def success(self):
+        self.failures = 0
+
+    def failure(self, reason):
+        self.failures += 1
+        if self.threshold and not self.isOpen and self.failures >= self.threshold:
+            self.isOpen = True
+            logger.warning(
+                f"{self.client.app} instance {self.client.label} failed {self.failures} times in a row ({reason}), "
+                f"pausing requests to it until it answers again"
+            )
+            self._probeTask = asyncio.create_task(self._probe())
+
+    async def _probe(self):
+        while self.isOpen:
+            await asyncio.sleep(self.probeInterval)
+            try:
+                response = await self.client.session.get("system/status")
+            except httpx.TransportError as e:
+                logger.debug(f"{self.client.app} instance {self.client.label} is still unavailable: {e!r}")
+                continue
+            if response.status_code not in RETRY_STATUSES:
+                self.isOpen = False
+                self.failures = 0
+                logger.info(f"{self.client.app} instance {self.client.label} is available again")
+
+    def stop(self):
+        if self._probeTask is not None:
+            self._probeTask.cancel()
+            self._probeTask = None
+
+
+class ArrClient:
+    def __init__(self, app, instance):
+        self.app = app
+        self.label = instance["label"]
+        self.config = instance
+
+        upstream = config["upstream"]
+        self.retries = upstream["retries"]
+        self.retryBackoff = upstream["retryBackoff"]
+        self.breaker = CircuitBreaker(self, upstream["breakerThreshold"], upstream["breakerProbeInterval"])
+        self.bulkhead = Bulkhead(
+            self,
+            instance.get("maxConcurrentRequests", upstream["maxConcurrentRequests"]),
+            instance.get("queueTimeout", upstream["queueTimeout"]),
+        )
+
+        server = instance["server"]
+        http = "https://" if server["ssl"] else "http://"
+        baseUrl = f"{http}{server['addr']}:{server['port']}{server['path']}api/v3/"
+
+        self.session = httpx.AsyncClient(
+            base_url=baseUrl,
+            # Library and lookup responses are large and compress well
+            headers={"X-Api-Key": str(instance["auth"]["apikey"]), "Accept-Encoding": "gzip, deflate"},
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=60),
+            timeout=httpx.Timeout(
+                instance.get("readTimeout", upstream["readTimeout"]),
+                connect=instance.get("connectTimeout", upstream["connectTimeout"]),
+            ),
+        )
+
+        # GETs that are in flight, by URL. An identical GET made meanwhile waits for the same response
+        self._inflight = {}
+        self.requests = 0
+        self.coalesced = 0
+
+    # Sends a request through the circuit breaker and the bulkhead. GETs are idempotent, so they are retried
+    # on connection errors, timeouts and gateway errors, with exponential backoff and jitter.
+    # A retry queues for a new slot, the slot is not held while waiting for it
+    async def _request(self, method, endpoint, **kwargs):
+        attempts = self.retries + 1 if method == "GET" else 1
+        for attempt in range(attempts):
+            self.breaker.check()
+            try:
+                async with self.bulkhead.slot():
+                    self.breaker.check()
+                    self.requests += 1
+                    start = time.perf_counter()
+                    with tracing.span("arr", f"{method} {metrics.endpointName(endpoint)}", instance=self.label) as details:
+                        try:
+                            response = await self.session.request(method, str(endpoint), **kwargs)
+                        except httpx.TransportError as e:
+                            metrics.observeUpstream(self, method, endpoint, time.perf_counter() - start, type(e).__name__)
+                            raise
+                        details["status"] = response.status_code
+                        if attempt:
+                            details["attempt"] = attempt + 1
+                    metrics.observeUpstream(
+                        self, method, endpoint, time.perf_counter() - start,
+                        f"HTTP {response.status_code}" if response.status_code >= 400 else None,
+                    )
+            except httpx.TransportError as e:
+                self.breaker.failure(repr(e))
+                if attempt == attempts - 1 or self.breaker.isOpen:
+                    raise InstanceUnavailable(self) from e
+                reason = repr(e)
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.success()
+                    return response
+                self.breaker.failure(f"HTTP {response.status_code}")
+                if attempt == attempts - 1 or self.breaker.isOpen:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            delay = random.uniform(0.5, 1.5) * self.retryBackoff * 2 ** attempt
+            logger.debug(f"{method} {self.app}/{self.label}: {endpoint} failed ({reason}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _get(self, endpoint, parameters):
+        logger.debug(f"GET {self.app}/{self.label}: {endpoint} {parameters or ''}")
+        return await self._request("GET", endpoint, params=parameters)
+
+    async def get(self, endpoint, parameters=None):
+        key = (str(endpoint), tuple(sorted((str(k), str(v)) for k, v in (parameters or {}).items())))
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = self._inflight[key] = asyncio.ensure_future(self._get(endpoint, parameters))
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+            # Shielded, so a caller that is cancelled does not cancel the request for the others
+            return await asyncio.shield(pending)
+
+        self.coalesced += 1
+        logger.debug(f"GET {self.app}/{self.label}: {endpoint} {parameters or ''} joins the request in flight")
+        # The request itself is traced for the caller that started it
+        with tracing.span("arr", f"GET {metrics.endpointName(endpoint)}", instance=self.label, coalesced=True):
+            return await asyncio.shield(pending)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "inFlight": len(self._inflight),
+            "available": not self.breaker.isOpen,
+            "active": self.bulkhead.active,
+            "queued": self.bulkhead.queued,
+            "rejected": self.bulkhead.rejected,
+        }
+
+    # Yields the elements of a JSON array response one by one while it is downloaded,
+    # so a huge library never has to be in memory as a whole. Raises httpx.HTTPStatusError on an error status
+    async def getItems(self, endpoint, parameters=None):
+        logger.debug(f"GET {self.app}/{self.label}: {endpoint} {parameters or ''} (streamed)")
+        # Not retried, as part of the items may already have been handed out
+        self.breaker.check()
+        start = None
+        error = None
+        try:
+            async with self.bulkhead.slot():
+                start = time.perf_counter()
+                with tracing.span("arr", f"GET {metrics.endpointName(endpoint)}", instance=self.label, streamed=True) as details:
+                    async with self.session.stream("GET", str(endpoint), params=parameters) as response:
+                        self.requests += 1
+                        details["status"] = response.status_code
+                        if response.status_code in RETRY_STATUSES:
+                            self.breaker.failure(f"HTTP {response.status_code}")
+                        else:
+                            self.breaker.success()
+                        if response.status_code >= 400:
+                            error = f"HTTP {response.status_code}"
+                        response.raise_for_status()
+                        async for item in jsonstream.iterArray(response.aiter_text()):
+                            yield item
+        except httpx.TransportError as e:
+            error = type(e).__name__
+            self.breaker.failure(repr(e))
+            raise InstanceUnavailable(self) from e
+        finally:
+            if start is not None:
+                metrics.observeUpstream(self, "GET", endpoint, time.perf_counter() - start, error)
+
+    async def post(self, endpoint, data):
+        logger.debug(f"POST {self.app}/{self.label}: {endpoint}")
+        return await self._request(
+            "POST", endpoint, content=fastjson.dumps(data), headers={"Content-Type": "application/json"}
+        )
+
+    async def delete(self, endpoint, parameters=None):
+        logger.debug(f"DELETE {self.app}/{self.label}: {endpoint} {parameters or ''}")
+        return await self._request("DELETE", endpoint, params=parameters)
+
+    async def close(self):
+        self.breaker.stop()
+        await self.session.aclose()
+
+
+# Build a client for every configured Radarr and Sonarr instance, once at startup
+def buildClients():
+    for app in ("radarr", "sonarr"):
+        for instance in config[app]["instances"]:
+            key = (app, instance["label"])
+            if key not in _clients:
+                _clients[key] = ArrClient(app, instance)
+                logger.debug(f"Created client for {app} instance {instance['label']}")
+
+
+def getClient(app, label):
+    if not _clients:
+        buildClients()
+    client = _clients.get((app, label))
+    if client is None:
+        # Labels coming back from keyboard replies may have been lowercased
+        client = next((c for c in _clients.values() if c.app == app and c.label.lower() == str(label).lower()), None)
+    if client is None:
+        raise ValueError(f"No {app} instance with label '{label}' in configuration")
+    return client
+
+
+def getClients(app=None):
+    if not _clients:
+        buildClients()
+    return [client for client in _clients.values() if app is None or client.app == app]
+
+
+async def closeClients():
+    for client in list(_clients.values()):
+        await client.close()
+    _clients.clear()
+
+
+def getStats():
+    return {f"{client.app}/{client.label}": client.stats() for client in _clients.values()}
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import time
+
+import logger
+import statestore
+from config import config
+from definitions import ADMIN_PATH, ALLOWLIST_PATH
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.authstore", logLevel, config.get("logToConsole", False))
+
+# How often (in seconds) admin.txt and allowlist.txt are checked for changes
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+# Authorized chats are kept in a set, so checking a chat does not hit the disk. The state database is
+# written through on every change and only read once, at the first check (chatid.txt is imported once by statestore)
+class ChatList:
+    def __init__(self, table):
+        self.table = table
+        self._ids = None
+
+    def _load(self):
+        if self._ids is None:
+            self._ids = set(statestore.getChats(self.table))
+        return self._ids
+
+    def contains(self, chatId):
+        return str(chatId) in self._load()
+
+    def entries(self):
+        return statestore.getChats(self.table)
+
+    def add(self, chatId, name=None):
+        statestore.addChat(self.table, chatId, name)
+        self._load().add(str(chatId))
+
+
+# admin.txt and allowlist.txt are maintained by hand (and mounted read-only in Docker/Helm),
+# so they stay the source. Whenever they change on disk they are read into a set, which answers
+# the checks. Every line is "<id or username>[ - <name>]".
+class UserList:
+    def __init__(self, path):
+        self.path = path
+        self.ids = frozenset()
+        self._signature = None
+        self._checked = 0.0
+
+    def _reload(self):
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked < RELOAD_CHECK_INTERVAL:
+            return
+        self._checked = now
+
+        if not os.path.exists(self.path):
+            with open(self.path, "w") as file:
+                pass  # Create an empty file
+
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+
+        with open(self.path, "r") as file:
+            users = [statestore.parseLine(line)[0] for line in file if line.strip()]
+        self.ids = frozenset(str(user) for user in users)
+        self._signature = signature
+        logger.debug(f"Loaded {len(users)} entries from {self.path}")
+
+    def contains(self, *keys):
+        self._reload()
+        return any(str(key) in self.ids for key in keys)
+
+
+chats = ChatList("chats")
+notifications = ChatList("notifications")
+admins = UserList(ADMIN_PATH)
+allowlist = UserList(ALLOWLIST_PATH)
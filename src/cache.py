@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import logging
+import time
+from collections import OrderedDict
+
+import fastjson
+import logger
+from config import config
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.cache", logLevel, config.get("logToConsole", False))
+
+_MISSING = object()
+
+
+# Bounded LRU cache whose entries expire ttl seconds after they were stored
+class TTLCache:
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key, value):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / total if total else 0.0,
+        }
+
+
+def normalizeTerm(term):
+    return " ".join(str(term).lower().split())
+
+
+searchCache = TTLCache("search", config.get("searchCacheSize", 256), config.get("searchCacheTTL", 600))
+# Root folders, quality profiles and tags per instance. They rarely change, so only the TTL bounds staleness
+metadataCache = TTLCache("metadata", 1024, config.get("metadataCacheTTL", 3600))
+
+
+# GET a metadata endpoint (root folders, quality profiles, tags, notifications) of a Radarr or Sonarr instance.
+# Only successful responses are cached
+async def getMetadata(client, endpoint):
+    cacheKey = (client.app, client.label, endpoint.lower())
+    parsed_json = metadataCache.get(cacheKey)
+    if parsed_json is None:
+        req = await client.get(endpoint)
+        parsed_json = fastjson.loads(req.content)
+        if req.status_code == 200:
+            metadataCache.set(cacheKey, parsed_json)
+    return parsed_json
+
+
+def flushAll():
+    for c in (searchCache, metadataCache):
+        c.clear()
+    logger.info("Search and metadata caches flushed")
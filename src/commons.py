@@ -1,12 +1,13 @@
+import asyncio
 import logging
-import math
-import os
 import re
 from telegram.ext import ConversationHandler
 import logger
 from config import config
-from definitions import ADMIN_PATH, CHATID_PATH, ALLOWLIST_PATH, NOTIFICATIONLIST_PATH
 from translations import i18n
+import arrclient
+import authstore
+import statestore
 import radarr as radarr
 import sonarr as sonarr
 
@@ -14,61 +15,30 @@ import sonarr as sonarr
 logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
 logger = logger.getLogger("addarr.commons", logLevel, config.get("logToConsole", False))
 
-_current_instance = None
-
-# Sets the global label that can be accessed within other functions
-def setInstanceName(label: str):
-    global _current_instance
-    _current_instance = label
-
-def getInstanceName() -> str:
-    global _current_instance
-    return _current_instance
-
-def getInstance(app):
-    instances = config[app]["instances"]
-    if _current_instance:
-        # Find the instance with the matching label
-        for instance in instances:
-            if instance["label"] == _current_instance:
-                return instance
-    else:
-        logger.warning('instance not set')
-            
-
 def generateServerAddr(app: str):
     try:
-        logger.debug(app)
-        if not app.lower() == 'radarr' and not app.lower() == 'sonarr':
-            logger.debug('generating server address for other service app')
-            if config[app]["server"]["ssl"]:
-                http = "https://"
-            else:
-                http = "http://"
-            addr = config[app]["server"]["addr"]
-            port = config[app]["server"]["port"]
-            path = config[app]["server"]["path"]
-
-            return f"{http}{addr}:{port}{path}"
+        logger.debug(f'generating server address for {app}')
+        if config[app]["server"]["ssl"]:
+            http = "https://"
         else:
-            logger.debug('generating server address for sonarr/radarr')
-            instance = getInstance(app)
-            if instance["server"]["ssl"]:
-                http = "https://"
-            else:
-                http = "http://"
-
-            addr = instance["server"]["addr"]
-            port = instance["server"]["port"]
-            path = instance["server"]["path"]
-        
-            return f"{http}{addr}:{port}{path}"
-       
+            http = "http://"
+        addr = config[app]["server"]["addr"]
+        port = config[app]["server"]["port"]
+        path = config[app]["server"]["path"]
+
+        return f"{http}{addr}:{port}{path}"
+
     except KeyError as e:
-        logger.warning(f"Missing key {e} in configuration for {_current_instance} instance.")
+        logger.warning(f"Missing key {e} in configuration for {app}.")
             
     except Exception as e:
-        logger.warning(f"Failed to generate server address for {_current_instance}: {e}")
+        logger.warning(f"Failed to generate server address for {app}: {e}")
+
+
+# (connect, read) timeout of the requests made to SABnzbd and qBittorrent
+def requestTimeout():
+    upstream = config["upstream"]
+    return (upstream["connectTimeout"], upstream["readTimeout"])
 
 
 def cleanUrl(text):
@@ -78,9 +48,7 @@ def cleanUrl(text):
 
 def generateApiQuery(app, endpoint, parameters={}):
     try:
-        instance = getInstance(app)
-        
-        apikey = instance["auth"]["apikey"]
+        apikey = config[app]["auth"]["apikey"]
         url = (
             generateServerAddr(app) + "api/v3/" + str(endpoint) + "?apikey=" + str(apikey)
         )
@@ -98,42 +66,19 @@ def generateApiQuery(app, endpoint, parameters={}):
 
 # Check if Id is authenticated
 def checkId(update):
-    authorize = False
-    
-    if not os.path.exists(CHATID_PATH):
-        with open(CHATID_PATH, "w") as file:
-            pass  # Create an empty file
-    
-    with open(CHATID_PATH, "r") as file:
-        firstChar = file.read(1)
-        if not firstChar:  # File is empty
-            return False
-
-    with open(CHATID_PATH, "r") as file:
-        for line in file:
-            chatId = line.strip("\n").split(" - ")[0]
-            if chatId == str(update.effective_message.chat_id):
-                authorize = True
-
-    return authorize
+    return authstore.chats.contains(update.effective_message.chat_id)
 
-# Check if user has subscribed to notifications
+# Check if user has subscribed to notifications on every instance. All instances are queried at the same time
 async def checkNotificationSubscribed(chatid):
-    onInstance = False
-    radarr_instances = config['radarr']['instances']
-    sonarr_instances = config['sonarr']['instances']
-
-    for instance in radarr_instances:
-        radarr.setInstance(instance["label"])
-        setInstanceName(instance["label"])
-        onInstance = radarr.notificationProfileExist(chatid)
-        
-    for instance in sonarr_instances:
-        sonarr.setInstance(instance["label"])
-        setInstanceName(instance["label"])
-        onInstance = sonarr.notificationProfileExist(chatid)
-
-    return onInstance
+    clients = arrclient.getClients()
+    results = await asyncio.gather(
+        *[getClientService(client).notificationProfileExist(client, chatid) for client in clients],
+        return_exceptions=True,
+    )
+    for client, result in zip(clients, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Could not check notification profiles on {client.app} instance {client.label}: {result}")
+    return all(result is True for result in results)
 
 async def generateProfileName(context, chatid):
     chat = await context.bot.get_chat(chatid)
@@ -163,37 +108,33 @@ async def authentication(update, context):
         return ConversationHandler.END
         
     chatid = update.effective_message.chat_id
-    with open(CHATID_PATH, "r") as file:
-        if(str(chatid) in file.read()):
+    if authstore.chats.contains(chatid):
+        await context.bot.send_message(
+            chat_id=update.effective_message.chat_id,
+            text=i18n.t("addarr.Authorization.ChatID_Allowed"),
+        )
+    else:
+        password = update.message.text
+        # This will remove both /auth and auth from the password string if they are present.
+        # It ensures that even if there is no leading slash, it will still be detected and removed.
+        if("auth" in password.lower()):
+            password = password.lower().replace("/auth", "").replace("auth", "").strip()
+        if str(password).strip() == str(config["telegram"]["password"]):
+            chatId, chatName = statestore.parseLine(await getChatName(context, chatid))
+            authstore.chats.add(chatId, chatName)
             await context.bot.send_message(
                 chat_id=update.effective_message.chat_id,
-                text=i18n.t("addarr.Authorization.ChatID_Allowed"),
+                text=i18n.t("addarr.Authorization.ChatID_Added"),
             )
-            file.close()
+            return "added"
         else:
-            file.close()
-            password = update.message.text
-            # This will remove both /auth and auth from the password string if they are present.
-            # It ensures that even if there is no leading slash, it will still be detected and removed.
-            if("auth" in password.lower()):
-                password = password.lower().replace("/auth", "").replace("auth", "").strip()
-            if str(password).strip() == str(config["telegram"]["password"]):
-                with open(CHATID_PATH, "a") as file:
-                    file.write(await getChatName(context, chatid))
-                    await context.bot.send_message(
-                        chat_id=update.effective_message.chat_id,
-                        text=i18n.t("addarr.Authorization.ChatID_Added"),
-                    )
-                    file.close()
-                    return "added"
-            else:
-                logger.warning(
-                    f"Failed authentication attempt by [{update.message.from_user.username}]. Password entered: [{password}]"
-                )
-                await context.bot.send_message(
-                    chat_id=update.effective_message.chat_id, text=i18n.t("addarr.Authorization.WrongPassword")
-                )
-                return ConversationHandler.END # This only stops the auth conv, so it goes back to choosing screen
+            logger.warning(
+                f"Failed authentication attempt by [{update.message.from_user.username}]. Password entered: [{password}]"
+            )
+            await context.bot.send_message(
+                chat_id=update.effective_message.chat_id, text=i18n.t("addarr.Authorization.WrongPassword")
+            )
+            return ConversationHandler.END # This only stops the auth conv, so it goes back to choosing screen
 
 
 async def getChatName(context, chatid):
@@ -220,25 +161,9 @@ async def getChatName(context, chatid):
 
 # Check if user is an admin or an allowed user
 def checkAllowed(update, mode):
-    if mode == "admin": 
-        path = ADMIN_PATH
-    else: 
-        path = ALLOWLIST_PATH
-
-    if not os.path.exists(path):
-        with open(path, "w") as file:
-            pass  # Create an empty file
-
-    admin = False
+    users = authstore.admins if mode == "admin" else authstore.allowlist
     user = update.effective_user
-
-    with open(path, "r") as file:
-        for line in file:
-            chatId = line.strip("\n").split(" - ")[0]
-            if chatId == str(user["username"]) or chatId == str(user["id"]):
-                admin = True
-
-    return admin
+    return users.contains(user["username"], user["id"])
 
 
 def format_bytes(num, suffix='B'):
@@ -249,61 +174,16 @@ def format_bytes(num, suffix='B'):
     return "%.1f%s%s" % (num, 'Yi', suffix)
 
 
-def format_long_list_message(list):
-    string = ""
-    for item in list:
-        string += "• " \
-                  + item["title"] \
-                  + " (" \
-                  + str(item["year"]) \
-                  + ")" \
-                  + "\n" \
-                  + "        status: " \
-                  + item["status"] \
-                  + "\n" \
-                  + "        monitored: " \
-                  + str(item["monitored"]).lower() \
-                  + "\n"
-
-    # max length of a message is 4096 chars
-    if len(string) <= 4096:
-        return string
-    # split string if longer then 4096 chars
-    else:
-        neededSplits = math.ceil(len(string) / 4096)
-        positionNewLine = []
-        index = 0
-        while index < len(string):  # Get positions of newline, so that the split will happen after a newline
-            i = string.find("\n", index)
-            if i == -1:
-                return positionNewLine
-            positionNewLine.append(i)
-            index += 1
-
-        # split string at newline closest to maxlength
-        stringParts = []
-        lastSplit = timesSplit = 0
-        i = 4096
-        while i > 0 and len(string) > 4096:
-            if timesSplit < neededSplits:
-                if i + lastSplit in positionNewLine:
-                    stringParts.append(string[0:i])
-                    string = string[i + 1:]
-                    timesSplit += 1
-                    lastSplit = i
-                    i = 4096
-            i -= 1
-        stringParts.append(string)
-        return stringParts
+def formatListItem(item):
+    return (
+        f"• {item['title']} ({item['year']})\n"
+        f"        status: {item['status']}\n"
+        f"        monitored: {str(item['monitored']).lower()}\n"
+    )
 
 
 def getAuthChats():
-    chats = []
-    with open(CHATID_PATH, "r") as file:
-        for line in file:
-            chats.append(line.strip("\n"))
-        file.close()
-    return chats
+    return authstore.chats.entries()
 
 def getService(context):
     if context.user_data.get("choice").lower() == i18n.t("addarr.General.Series").lower():
@@ -315,6 +195,53 @@ def getService(context):
         raise ValueError(
             f"Cannot determine service based on unknown or missing choice: {context.user_data.get('choice')}"
         )
+
+
+# Instance "label" used when a search should run on every instance of a service
+ALL_INSTANCES = "*"
+
+
+def getClientService(client):
+    return radarr if client.app == "radarr" else sonarr
+
+
+def getServiceName(context):
+    return 'radarr' if getService(context) == radarr else 'sonarr'
+
+
+# Client of the Radarr/Sonarr instance selected in this conversation
+def getArrClient(context):
+    return arrclient.getClient(getServiceName(context), context.user_data["instance"])
+
+
+# Search every instance of the service at the same time and merge the results by tmdbId/tvdbId.
+# Every result lists the instances that already have it in "inInstances", and keeps the lookup record of each instance.
+async def searchAllInstances(app, title):
+    async def searchInstance(client):
+        service = getClientService(client)
+        searchResult = await service.search(client, title)
+        if not searchResult:
+            return []
+        results = service.giveTitles(searchResult)
+        for result in results:
+            result["inLibrary"] = await service.inLibrary(client, result["id"])
+        return results
+
+    clients = arrclient.getClients(app)
+    responses = await asyncio.gather(*[searchInstance(client) for client in clients], return_exceptions=True)
+
+    merged = {}
+    for client, results in zip(clients, responses):
+        if isinstance(results, Exception):
+            logger.warning(f"Search on {app} instance {client.label} failed: {results}")
+            continue
+        for result in results:
+            inLibrary = result.pop("inLibrary")
+            entry = merged.setdefault(result["id"], dict(result, lookups={}, inInstances=[]))
+            entry["lookups"][client.label] = result["lookup"]
+            if inLibrary:
+                entry["inInstances"].append(client.label)
+    return list(merged.values())
     
 
 def clearUserData(context):
@@ -1,3 +1,5 @@
+import re
+
 import yaml
 
 from definitions import CONFIG_PATH, CONFIG_EXAMPLE_PATH, DEFAULT_SETTINGS
@@ -26,9 +28,24 @@ def checkConfig():
     return missingConfig
 
 
+# Instance labels are sent back in button callback data, which Telegram limits to 64 bytes.
+# The longest data around a label is that of the export buttons, "allExport=sonarr:jsonlgz:<label>"
+MAX_LABEL_BYTES = 64 - len("allExport=sonarr:jsonlgz:")
+
+
 def checkConfigValues():
     wrongValues = []
     languages = ["de-de", "en-us", "es-es", "fr-fr", "it-it", "nl-be", "pl-pl", "pt-pt", "ru-ru"]
     if config["language"] not in languages:
         wrongValues.append("language")
+    if config["webhook"].get("enable"):
+        if not config["webhook"].get("url"):
+            wrongValues.append("webhook/url")
+        secretToken = config["webhook"].get("secretToken")
+        if secretToken and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", str(secretToken)):
+            wrongValues.append("webhook/secretToken")
+    for app in ("sonarr", "radarr"):
+        for instance in config[app]["instances"]:
+            if len(str(instance["label"]).encode("utf-8")) > MAX_LABEL_BYTES:
+                wrongValues.append(f"{app}/instances/label ({instance['label']})")
     return wrongValues
@@ -14,6 +14,8 @@ LOG_PATH = os.path.join(ROOT_DIR, "logs", "addarr.log")
 ADMIN_PATH = os.path.join(ROOT_DIR, "admin.txt")
 ALLOWLIST_PATH = os.path.join(ROOT_DIR, "allowlist.txt")
 NOTIFICATIONLIST_PATH = os.path.join(ROOT_DIR, "notification.txt")
+STATE_DB_PATH = os.path.join(ROOT_DIR, "data", "addarr.db")
+TRACE_LOG_PATH = os.path.join(ROOT_DIR, "logs", "traces.jsonl")
 
 DEFAULT_SETTINGS = {
     "entrypointAuth": "auth", #auth or a custom entrypoint
@@ -25,9 +27,24 @@ DEFAULT_SETTINGS = {
     "entrypointTransmission": "transmission", #transmission or a custom entrypoint
     "entrypointSabnzbd": "sabnzbd", #sabnzbd or a custom entrypoint
     "entrypointqBittorrent": "qbittorrent", #qbittorrent or a custom entrypoint
+    "entrypointFlushCache": "flushCache", #flushCache or a custom entrypoint
     "logToConsole": True,
     "debugLogging": False,
     "language": "en-us",
     "transmission": { "enable": False },
-    "enableAdmin": False
+    "enableAdmin": False,
+    "libraryRefreshInterval": 900,
+    "searchCacheSize": 256,
+    "searchCacheTTL": 600,
+    "metadataCacheTTL": 3600,
+    "concurrentUpdates": 8,
+    "allPageSize": 25,
+    "messagesPerSecond": 30,
+    "messagesPerSecondPerChat": 1,
+    "messagesPerMinutePerGroup": 20,
+    "floodRetries": 3,
+    "upstream": { "connectTimeout": 5, "readTimeout": 30, "retries": 2, "retryBackoff": 0.5, "breakerThreshold": 5, "breakerProbeInterval": 30, "maxConcurrentRequests": 4, "queueTimeout": 20 },
+    "tracing": { "enable": False, "slowThreshold": 2.0 },
+    "metrics": { "enable": False, "listen": "127.0.0.1", "port": 9091 },
+    "webhook": { "enable": False, "url": None, "listen": "0.0.0.0", "port": 8443, "path": "addarr", "secretToken": None },
 }
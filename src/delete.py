@@ -5,9 +5,10 @@ from telegram.ext import ConversationHandler, ContextTypes
 import logging
 import logger
 
-from commons import authentication, checkAllowed, checkId, getService, clearUserData
+from commons import authentication, checkAllowed, checkId, getService, getArrClient, clearUserData
 from config import config
 from translations import i18n
+import library
 
 
 # Set up logging
@@ -189,17 +190,15 @@ async def storeMediaInstance(update : Update, context: ContextTypes.DEFAULT_TYPE
     else:
         logger.debug("Instance set from previous function")
     
-    instance = context.user_data["instance"]
     title = context.user_data["title"]
     choice = context.user_data["choice"]
     position = context.user_data["position"] = 0
 
-    service = getService(context)
-    service.setInstance(instance)
+    client = getArrClient(context)
 
-    service_Config = service.getInstance()
+    service_Config = client.config
     
-    if service_Config.get("adminRestrictions") and not checkAllowed(update, context, "admin"):
+    if service_Config.get("adminRestrictions") and not checkAllowed(update, "admin"):
         await context.bot.send_message(
             chat_id=update.effective_message.chat_id,
             text=i18n.t("addarr.Authorization.NotAdmin"),
@@ -207,71 +206,10 @@ async def storeMediaInstance(update : Update, context: ContextTypes.DEFAULT_TYPE
         logger.info(f"User {update.effective_message.chat_id} is not an admin. Delete service terminated. No action taken.")
         return ConversationHandler.END
     
-    searchResult = service.search(title)
+    # Only titles that are in the library can be deleted, so search the local library index
+    # instead of the metadata provider
+    searchResult = await library.getIndex(client).search(title)
     if not searchResult:
-        await context.bot.send_message( 
-            chat_id=update.effective_message.chat_id, 
-            text=i18n.t("addarr.SearchResults", count=0),
-        )
-        clearUserData(context)
-        return ConversationHandler.END
-        
-    context.user_data["output"] = service.giveTitles(searchResult)
-    idnumber = context.user_data["output"][position]["id"]
-
-    if service.inLibrary(idnumber):
-        keyboard = [
-                [
-                    InlineKeyboardButton(
-                        '\U00002795 '+i18n.t("addarr.Actions.Delete"),
-                        callback_data=i18n.t("addarr.Actions.Delete")
-                    ),
-                ],[
-                    InlineKeyboardButton(
-                        '\U000023ED '+i18n.t("addarr.Actions.StopDelete"),
-                        callback_data=i18n.t("addarr.Actions.StopDelete")
-                    ),
-                ],[ 
-                    InlineKeyboardButton(
-                        '\U0001F50D '+i18n.t("addarr.General.New"),
-                        callback_data=i18n.t("addarr.General.New")
-                    ),
-                ]
-            ]
-        markup = InlineKeyboardMarkup(keyboard)
-        
-        message = f"\n\n*{context.user_data['output'][position]['title']} ({context.user_data['output'][position]['year']})*"
-        
-        if "update_msg" in context.user_data:
-            await context.bot.edit_message_text(
-                message_id=context.user_data["update_msg"],
-                chat_id=update.effective_message.chat_id,
-                text=message,
-                parse_mode=ParseMode.MARKDOWN,
-            )
-        else:
-            msg = await context.bot.send_message(chat_id=update.effective_message.chat_id, text=message,parse_mode=ParseMode.MARKDOWN,)
-            context.user_data["update_msg"] = msg.message_id
-        try:
-            img = await context.bot.sendPhoto(
-                chat_id=update.effective_message.chat_id,
-                photo=context.user_data["output"][position]["poster"],
-            )
-        except:
-            context.user_data["photo_update_msg"] = None
-        else:
-            context.user_data["photo_update_msg"] = img.message_id
-
-        if choice == i18n.t("addarr.General.Movie"):
-            message=i18n.t("addarr.Messages.ThisDelete", subjectWithArticle=i18n.t("addarr.General.MovieWithArticle").lower())
-        else:
-            message=i18n.t("addarr.Messages.ThisDelete", subjectWithArticle=i18n.t("addarr.General.SeriesWithArticle").lower())
-        msg = await context.bot.send_message(
-            chat_id=update.effective_message.chat_id, text=message, reply_markup=markup
-        )
-        context.user_data["title_update_msg"] = context.user_data["update_msg"]
-        context.user_data["update_msg"] = msg.message_id
-    else:
         if choice == i18n.t("addarr.General.Movie"):
             message=i18n.t("addarr.Messages.NoExist", subjectWithArticle=i18n.t("addarr.General.MovieWithArticle"))
         else:
@@ -283,18 +221,127 @@ async def storeMediaInstance(update : Update, context: ContextTypes.DEFAULT_TYPE
         )
         clearUserData(context)
         return ConversationHandler.END
+
+    context.user_data["output"] = searchResult
+    message = i18n.t("addarr.SearchResults", count=len(context.user_data["output"]))
+    message += f"\n\n*{context.user_data['output'][position]['title']} ({context.user_data['output'][position]['year']})*"
+
+    if "update_msg" in context.user_data:
+        await context.bot.edit_message_text(
+            message_id=context.user_data["update_msg"],
+            chat_id=update.effective_message.chat_id,
+            text=message,
+            parse_mode=ParseMode.MARKDOWN,
+        )
+    else:
+        msg = await context.bot.send_message(chat_id=update.effective_message.chat_id, text=message,parse_mode=ParseMode.MARKDOWN,)
+        context.user_data["update_msg"] = msg.message_id
+    context.user_data["title_update_msg"] = context.user_data["update_msg"]
+    await sendDeleteOption(update, context)
+    return DELETE_CONFIRM
+
+
+# Sends the poster and the delete question for the result at the current position
+async def sendDeleteOption(update, context):
+    position = context.user_data["position"]
+    try:
+        img = await context.bot.sendPhoto(
+            chat_id=update.effective_message.chat_id,
+            photo=context.user_data["output"][position]["poster"],
+        )
+    except:
+        context.user_data["photo_update_msg"] = None
+    else:
+        context.user_data["photo_update_msg"] = img.message_id
+
+    keyboard = [
+            [
+                InlineKeyboardButton(
+                    '\U00002795 '+i18n.t("addarr.Actions.Delete"),
+                    callback_data=i18n.t("addarr.Actions.Delete")
+                ),
+            ],[
+                InlineKeyboardButton(
+                    '\U000023ED '+i18n.t("addarr.Actions.StopDelete"),
+                    callback_data=i18n.t("addarr.Actions.StopDelete")
+                ),
+            ],[ 
+                InlineKeyboardButton(
+                    '\U0001F50D '+i18n.t("addarr.General.New"),
+                    callback_data=i18n.t("addarr.General.New")
+                ),
+            ]
+        ]
+    prev_next_row = []
+    if position > 0:
+        prev_next_row.append(
+            InlineKeyboardButton(
+                '\U000023EE ' + i18n.t("addarr.General.PreviousResult"),
+                callback_data=i18n.t("addarr.General.PreviousResult")
+            )
+        )
+    if position < len(context.user_data["output"]) - 1:
+        prev_next_row.append(
+            InlineKeyboardButton(
+                '\U000023ED ' + i18n.t("addarr.General.NextResult"),
+                callback_data=i18n.t("addarr.General.NextResult")
+            )
+        )
+    if prev_next_row:
+        keyboard.insert(1, prev_next_row)
+    markup = InlineKeyboardMarkup(keyboard)
+
+    if context.user_data["choice"] == i18n.t("addarr.General.Movie"):
+        message=i18n.t("addarr.Messages.ThisDelete", subjectWithArticle=i18n.t("addarr.General.MovieWithArticle").lower())
+    else:
+        message=i18n.t("addarr.Messages.ThisDelete", subjectWithArticle=i18n.t("addarr.General.SeriesWithArticle").lower())
+    msg = await context.bot.send_message(
+        chat_id=update.effective_message.chat_id, text=message, reply_markup=markup
+    )
+    context.user_data["update_msg"] = msg.message_id
+
+
+async def nextDeleteOption(update, context):
+    return await changeDeleteOption(update, context, 1)
+
+
+async def prevDeleteOption(update, context):
+    return await changeDeleteOption(update, context, -1)
+
+
+async def changeDeleteOption(update, context, step):
+    position = min(max(context.user_data["position"] + step, 0), len(context.user_data["output"]) - 1)
+    context.user_data["position"] = position
+
+    message = i18n.t("addarr.SearchResults", count=len(context.user_data["output"]))
+    message += f"\n\n*{context.user_data['output'][position]['title']} ({context.user_data['output'][position]['year']})*"
+    await context.bot.edit_message_text(
+        message_id=context.user_data["title_update_msg"],
+        chat_id=update.effective_message.chat_id,
+        text=message,
+        parse_mode=ParseMode.MARKDOWN,
+    )
+    if context.user_data["photo_update_msg"]:
+        await context.bot.delete_message(
+            message_id=context.user_data["photo_update_msg"],
+            chat_id=update.effective_message.chat_id,
+        )
+    await context.bot.delete_message(
+        message_id=context.user_data["update_msg"],
+        chat_id=update.effective_message.chat_id,
+    )
+    await sendDeleteOption(update, context)
     return DELETE_CONFIRM
 
 async def deleteMedia(update, context):  
     choice = context.user_data["choice"]  
     position = context.user_data["position"]
-    instance = context.user_data["instance"]
    
     service = getService(context)
-    service.setInstance(instance)
+    client = getArrClient(context)
     idnumber = context.user_data["output"][position]["id"]
 
-    if service.removeFromLibrary(idnumber):
+    if await service.removeFromLibrary(client, idnumber):
         if choice == i18n.t("addarr.General.Movie"):
             message=i18n.t("addarr.Messages.DeleteSuccess", subjectWithArticle=i18n.t("addarr.General.MovieWithArticle"))
         else:
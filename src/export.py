@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import csv
+import gzip
+import io
+import json
+import logging
+
+import logger
+from config import config
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.export", logLevel, config.get("logToConsole", False))
+
+# Export formats offered by /allMovies and /allSeries, with their file extension
+EXPORT_FORMATS = {
+    "csv": "csv",
+    "jsonl": "jsonl",
+    "csvgz": "csv.gz",
+    "jsonlgz": "jsonl.gz",
+}
+
+EXPORT_FIELDS = ["title", "year", "monitored", "status"]
+
+
+# Write the items one by one and return the file contents. Telegram reads the whole document before
+# uploading it, so the contents are returned as bytes, which send_document takes together with a filename
+def writeExport(items, exportFormat):
+    buffer = io.BytesIO()
+    target = gzip.GzipFile(fileobj=buffer, mode="wb") if exportFormat.endswith("gz") else buffer
+    text = io.TextIOWrapper(target, encoding="utf-8", newline="")
+
+    count = 0
+    if exportFormat.startswith("csv"):
+        writer = csv.DictWriter(text, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for item in items:
+            writer.writerow(item)
+            count += 1
+    else:
+        for item in items:
+            text.write(json.dumps({field: item.get(field) for field in EXPORT_FIELDS}, ensure_ascii=False) + "\n")
+            count += 1
+
+    # Closing the text wrapper would close the buffer too, so it is only detached. Closing gzip writes its trailer
+    text.flush()
+    text.detach()
+    if target is not buffer:
+        target.close()
+    logger.debug(f"Exported {count} items as {exportFormat}")
+    return buffer.getvalue()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+
+import logger
+from config import config
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.fastjson", logLevel, config.get("logToConsole", False))
+
+# orjson is optional. It parses Arr responses several times faster than the json module,
+# which is used when orjson is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+logger.debug(f"Using {BACKEND} to encode and decode JSON")
+
+
+# Decode a response body. Takes the raw bytes, so the body is not decoded to text first
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Encode a request body to UTF-8 bytes
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+# Parses a JSON array that arrives in text chunks and yields its elements one at a time.
+# Only the unparsed rest of the stream and the current element are held in memory,
+# never the whole document.
+async def iterArray(chunks):
+    buffer = ""
+    position = 0
+    started = False
+    finished = False
+
+    async for chunk in chunks:
+        buffer = buffer[position:] + chunk
+        position = 0
+
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position >= len(buffer) or finished:
+                break
+
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError(f"Expected a JSON array, got {buffer[position:position + 20]!r}")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ",":
+                position += 1
+                continue
+            if buffer[position] == "]":
+                finished = True
+                position += 1
+                continue
+
+            try:
+                item, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element is not complete yet, wait for the next chunk
+                break
+            if isinstance(item, (int, float)) and (end == len(buffer) or buffer[end] not in _WHITESPACE + ",]"):
+                # A number is only complete when a delimiter follows, it may continue in the next chunk
+                break
+            position = end
+            yield item
+
+    if not finished:
+        if buffer[position:].strip():
+            # Whatever is left could not be parsed, let json report where
+            _decoder.raw_decode(buffer, position)
+        raise ValueError("JSON array ended unexpectedly")
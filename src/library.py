@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+import re
+import sys
+import time
+
+import httpx
+
+import arrclient
+import logger
+from config import config
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.library", logLevel, config.get("logToConsole", False))
+
+# Library endpoint and the external id every item is indexed by
+LIBRARY_ENDPOINTS = {
+    "radarr": ("movie", "tmdbId"),
+    "sonarr": ("series", "tvdbId"),
+}
+
+_indexes = {}
+_refreshTask = None
+
+
+# Compact record of one library item, used by the index, the local search and the library listings.
+# One is kept for every item of every instance, so it has no __dict__, and the status is interned
+# (a library only has a handful of distinct values). Items can still be read like dicts.
+class MediaItem:
+    __slots__ = ("id", "dbId", "title", "year", "monitored", "status", "poster")
+
+    def __init__(self, id, dbId, title, year, monitored, status, poster=None):
+        self.id = id
+        self.dbId = dbId
+        self.title = title
+        self.year = year
+        self.monitored = monitored
+        self.status = sys.intern(status) if isinstance(status, str) else status
+        self.poster = poster
+
+    # id is the external (TMDB/TVDB) id, dbId the id of the item in the Arr instance
+    @classmethod
+    def fromArr(cls, item, idKey):
+        return cls(
+            item.get(idKey),
+            item.get("id"),
+            item.get("title"),
+            item.get("year"),
+            item.get("monitored"),
+            item.get("status"),
+            next((image.get("remoteUrl") for image in item.get("images") or [] if image.get("coverType") == "poster"), None),
+        )
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __repr__(self):
+        return f"MediaItem(id={self.id!r}, title={self.title!r}, year={self.year!r})"
+
+
+class LibraryIndex:
+    def __init__(self, client):
+        self.client = client
+        self.app = client.app
+        self.label = client.label
+        self.endpoint, self.idKey = LIBRARY_ENDPOINTS[client.app]
+        self.items = {}
+        self.updated = None
+        self._sorted = None
+        self._trigrams = None
+        self._lock = asyncio.Lock()
+
+    async def _fetch(self):
+        # Build the new index aside and swap it in, so lookups never see a half-built dict.
+        # The library is parsed while it streams in, only the indexed fields of each item are kept
+        items = {}
+        try:
+            async for item in self.client.getItems(self.endpoint):
+                if self.idKey in item:
+                    items[item[self.idKey]] = MediaItem.fromArr(item, self.idKey)
+        except httpx.HTTPStatusError as e:
+            logger.warning(f"Could not refresh {self.app} library index for {self.label}: HTTP {e.response.status_code}")
+            return False
+        self.items = items
+        self._sorted = None
+        self._trigrams = None
+        self.updated = time.monotonic()
+        logger.debug(f"Indexed {len(self.items)} items from {self.app} instance {self.label}")
+        return True
+
+    async def refresh(self):
+        async with self._lock:
+            return await self._fetch()
+
+    async def ensureLoaded(self):
+        if self.updated is None:
+            async with self._lock:
+                # Another caller may have built the index while we were waiting
+                if self.updated is None:
+                    await self._fetch()
+
+    async def get(self, externalId):
+        await self.ensureLoaded()
+        return self.items.get(externalId)
+
+    async def contains(self, externalId):
+        return await self.get(externalId) is not None
+
+    def add(self, item):
+        if self.idKey in item and "id" in item:
+            externalId = item[self.idKey]
+            self._unindexTitle(externalId)
+            self.items[externalId] = MediaItem.fromArr(item, self.idKey)
+            self._indexTitle(externalId)
+            self._sorted = None
+
+    def remove(self, externalId):
+        self._unindexTitle(externalId)
+        if self.items.pop(externalId, None) is not None:
+            self._sorted = None
+
+    # Items sorted by title. Sorted again only after the index changed, so paging through it is cheap
+    def sortedItems(self):
+        if self._sorted is None:
+            self._sorted = sorted(
+                self.items.values(),
+                key=lambda item: (str(item.title or "").casefold(), item.year or 0),
+            )
+        return self._sorted
+
+    # Trigram -> external ids of the titles containing it, plus the normalized title and trigram count
+    # of every item. Built on the first search after a full refresh, and kept up to date on add/remove
+    def _trigramIndex(self):
+        if self._trigrams is None:
+            self._trigrams = ({}, {})
+            for externalId in self.items:
+                self._indexTitle(externalId)
+        return self._trigrams
+
+    def _indexTitle(self, externalId):
+        if self._trigrams is None:
+            return
+        trigrams, titles = self._trigrams
+        title = self.items[externalId].title
+        titleSet = titleTrigrams(title)
+        titles[externalId] = (normalizeTitle(title), len(titleSet))
+        for trigram in titleSet:
+            trigrams.setdefault(trigram, set()).add(externalId)
+
+    def _unindexTitle(self, externalId):
+        if self._trigrams is None or externalId not in self._trigrams[1]:
+            return
+        trigrams, titles = self._trigrams
+        for trigram in titleTrigrams(self.items[externalId].title):
+            trigrams[trigram].discard(externalId)
+        del titles[externalId]
+
+    # Fuzzy title search in the local index, best match first.
+    # Titles are scored by the share of trigrams they have in common with the query (Dice coefficient).
+    async def search(self, query, limit=20, minScore=0.3):
+        await self.ensureLoaded()
+        queryTrigrams = titleTrigrams(query)
+        if not queryTrigrams:
+            return []
+        trigrams, titles = self._trigramIndex()
+
+        shared = {}
+        for trigram in queryTrigrams:
+            for externalId in trigrams.get(trigram, ()):
+                shared[externalId] = shared.get(externalId, 0) + 1
+
+        normalized = normalizeTitle(query)
+        matches = []
+        for externalId, count in shared.items():
+            title, trigramCount = titles[externalId]
+            score = 2 * count / (len(queryTrigrams) + trigramCount)
+            if normalized in title:
+                # Typing part of a title should find it, even when the title is much longer
+                score = max(score, 0.5) + 0.5
+            if score >= minScore:
+                matches.append((score, self.items[externalId]))
+        matches.sort(key=lambda match: (-match[0], str(match[1].title or "").casefold()))
+        return [record for score, record in matches[:limit]]
+
+
+def normalizeTitle(title):
+    return " ".join(re.sub(r"[^\w]+", " ", str(title or "").casefold()).split())
+
+
+def titleTrigrams(title):
+    normalized = normalizeTitle(title)
+    if not normalized:
+        return set()
+    padded = f"  {normalized} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def getIndex(client):
+    key = (client.app, client.label)
+    if key not in _indexes:
+        _indexes[key] = LibraryIndex(client)
+    return _indexes[key]
+
+
+async def refreshAll():
+    for client in arrclient.getClients():
+        try:
+            await getIndex(client).refresh()
+        except Exception as e:
+            logger.warning(f"Refreshing {client.app} library index for {client.label} failed: {e}")
+
+
+async def _refreshLoop(interval):
+    while True:
+        await refreshAll()
+        await asyncio.sleep(interval)
+
+
+def startRefresh():
+    global _refreshTask
+    interval = config.get("libraryRefreshInterval", 900)
+    if _refreshTask is None and interval:
+        _refreshTask = asyncio.create_task(_refreshLoop(interval))
+
+
+def stopRefresh():
+    global _refreshTask
+    if _refreshTask is not None:
+        _refreshTask.cancel()
+        _refreshTask = None
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+import asyncio
+import functools
+import logging
+import re
+import time
+
+import arrclient
+import cache
+import logger
+import outbox
+from config import config
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.metrics", logLevel, config.get("logToConsole", False))
+
+# Upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# How often (in seconds) the event loop lag is sampled
+LAG_INTERVAL = 0.5
+
+_server = None
+_lagTask = None
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, description, labelNames=()):
+        self.name = name
+        self.description = description
+        self.labelNames = labelNames
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelNames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, description, labelNames=(), buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelNames = labelNames
+        self.buckets = buckets
+        # labels -> [count per bucket, count, sum]
+        self._values = {}
+
+    def observe(self, value, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * len(self.buckets), 0, 0.0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][index] += 1
+                break
+        entry[1] += 1
+        entry[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        names = self.labelNames + ("le",)
+        for labels, (counts, count, total) in self._values.items():
+            cumulative = 0
+            for bound, bucketCount in zip(self.buckets, counts):
+                cumulative += bucketCount
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_count{_labels(self.labelNames, labels)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelNames, labels)} {total}")
+        return lines
+
+
+# Values the other modules already keep track of, read when the metrics are scraped.
+# `collect` returns (labels, value) pairs
+class Collected:
+    def __init__(self, name, description, labelNames, collect, kind="gauge"):
+        self.name = name
+        self.description = description
+        self.labelNames = labelNames
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{_labels(self.labelNames, labels)} {value}")
+        return lines
+
+
+handlerSeconds = Histogram("addarr_handler_duration_seconds", "Time spent in a conversation step", ("handler",))
+handlerErrors = Counter("addarr_handler_errors_total", "Conversation steps that raised an error", ("handler",))
+upstreamSeconds = Histogram(
+    "addarr_upstream_request_duration_seconds", "Duration of requests to Sonarr and Radarr",
+    ("app", "instance", "method", "endpoint"),
+)
+upstreamErrors = Counter(
+    "addarr_upstream_errors_total", "Failed requests to Sonarr and Radarr",
+    ("app", "instance", "method", "endpoint", "reason"),
+)
+eventLoopLag = Histogram("addarr_event_loop_lag_seconds", "How late the event loop woke up a sleeping task")
+
+
+def _cacheStats(field):
+    return lambda: [((c.name,), c.stats()[field]) for c in (cache.searchCache, cache.metadataCache)]
+
+
+def _clientStats(field):
+    return lambda: [
+        (tuple(key.split("/", 1)), int(stats[field])) for key, stats in arrclient.getStats().items()
+    ]
+
+
+def _outboxStats(field):
+    return lambda: [((), outbox.limiter.stats()[field])]
+
+
+METRICS = [
+    handlerSeconds,
+    handlerErrors,
+    upstreamSeconds,
+    upstreamErrors,
+    Collected("addarr_upstream_coalesced_total", "GETs that joined an identical request in flight", ("app", "instance"), _clientStats("coalesced"), "counter"),
+    Collected("addarr_upstream_rejected_total", "Requests that gave up waiting for a free slot", ("app", "instance"), _clientStats("rejected"), "counter"),
+    Collected("addarr_upstream_active_requests", "Requests running against an instance", ("app", "instance"), _clientStats("active")),
+    Collected("addarr_upstream_queued_requests", "Requests waiting for a free slot of an instance", ("app", "instance"), _clientStats("queued")),
+    Collected("addarr_upstream_available", "1 unless the circuit breaker of the instance is open", ("app", "instance"), _clientStats("available")),
+    Collected("addarr_cache_hits_total", "Cache hits", ("cache",), _cacheStats("hits"), "counter"),
+    Collected("addarr_cache_misses_total", "Cache misses", ("cache",), _cacheStats("misses"), "counter"),
+    Collected("addarr_cache_hit_ratio", "Share of cache lookups that were hits", ("cache",), _cacheStats("hitRatio")),
+    Collected("addarr_cache_entries", "Entries in the cache", ("cache",), _cacheStats("size")),
+    Collected("addarr_telegram_queue_depth", "Telegram requests waiting in the outbound rate limiter", (), _outboxStats("queued")),
+    Collected("addarr_telegram_sent_total", "Telegram requests sent", (), _outboxStats("sent"), "counter"),
+    Collected("addarr_telegram_flood_retries_total", "Telegram requests retried after a flood limit", (), _outboxStats("retries"), "counter"),
+    Collected("addarr_telegram_max_wait_seconds", "Longest wait in the outbound rate limiter", (), _outboxStats("maxWait")),
+    eventLoopLag,
+]
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Numeric ids in a path would give every movie its own series, e.g. movie/123 is counted as movie/{id}
+def endpointName(endpoint):
+    return re.sub(r"(?<=/)\d+(?=/|$)", "{id}", str(endpoint).strip("/"))
+
+
+def observeUpstream(client, method, endpoint, seconds, error=None):
+    endpoint = endpointName(endpoint)
+    upstreamSeconds.observe(seconds, client.app, client.label, method, endpoint)
+    if error:
+        upstreamErrors.inc(client.app, client.label, method, endpoint, error)
+
+
+# Wraps a conversation step, so its duration and errors are recorded under its name
+def timed(callback):
+    if getattr(callback, "_timed", False):
+        return callback
+    name = getattr(callback, "__name__", repr(callback))
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            handlerErrors.inc(name)
+            raise
+        finally:
+            handlerSeconds.observe(time.perf_counter() - start, name)
+
+    wrapper._timed = True
+    return wrapper
+
+
+async def _watchLag():
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        eventLoopLag.observe(max(0.0, loop.time() - start - LAG_INTERVAL))
+
+
+async def _serve(reader, writer):
+    try:
+        requestLine = (await reader.readline()).decode("latin-1").split()
+        while (await reader.readline()).strip():
+            pass  # Headers are not needed
+        if len(requestLine) >= 2 and requestLine[0] == "GET" and requestLine[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"Not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        logger.debug(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def start():
+    global _server, _lagTask
+    settings = config["metrics"]
+    if not settings.get("enable") or _server is not None:
+        return
+    _server = await asyncio.start_server(_serve, settings["listen"], int(settings["port"]))
+    _lagTask = asyncio.create_task(_watchLag())
+    logger.info(f"Serving metrics on http://{settings['listen']}:{settings['port']}/metrics")
+
+
+async def stop():
+    global _server, _lagTask
+    if _lagTask is not None:
+        _lagTask.cancel()
+        _lagTask = None
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+import logger
+import tracing
+from config import config
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.outbox", logLevel, config.get("logToConsole", False))
+
+# Waits longer than this (in seconds) are logged at info level
+SLOW_WAIT = 5.0
+
+# Telegram's per chat limits are about new messages. Edits, deletes and the like only count towards the global rate
+CHAT_PACED_ENDPOINTS = {"sendMessage", "sendPhoto", "sendDocument"}
+
+# A private chat may get a short burst (e.g. a poster and its caption), as long as the average over this many seconds stays within the rate
+CHAT_BURST_WINDOW = 3.0
+
+
+# Allows `limit` sends per `period` seconds (sliding window). Waiters are served in order.
+class RateLimit:
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self._sent = deque()
+        self._lock = asyncio.Lock()
+
+    def idle(self):
+        return not self._lock.locked() and (not self._sent or time.monotonic() - self._sent[-1] >= self.period)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= self.period:
+                    self._sent.popleft()
+                if len(self._sent) < self.limit:
+                    self._sent.append(now)
+                    return
+                await asyncio.sleep(self.period - (now - self._sent[0]))
+
+
+# Paces every Bot API request PTB makes at a global rate for the bot. Messages sent to a chat are paced
+# per chat as well (lower for groups, as Telegram allows fewer messages there). When Telegram still answers
+# with 429, all requests pause for retry_after and the request is tried again.
+class OutboundRateLimiter(BaseRateLimiter):
+    def __init__(self, perSecond, perChatPerSecond, perGroupPerMinute, maxRetries):
+        self.perChatPerSecond = perChatPerSecond
+        self.perGroupPerMinute = perGroupPerMinute
+        self.maxRetries = maxRetries
+        self._global = RateLimit(perSecond, 1.0)
+        self._chats = {}
+        self._resume = asyncio.Event()
+        self._resume.set()
+
+        self.queued = 0
+        self.sent = 0
+        self.retries = 0
+        self.totalWait = 0.0
+        self.maxWait = 0.0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chatLimit(self, chatId):
+        limit = self._chats.get(chatId)
+        if limit is None:
+            if len(self._chats) > 1000:
+                self._chats = {key: value for key, value in self._chats.items() if not value.idle()}
+            if isinstance(chatId, int) and chatId < 0 or isinstance(chatId, str):
+                limit = RateLimit(self.perGroupPerMinute, 60.0)
+            else:
+                limit = RateLimit(max(1, round(self.perChatPerSecond * CHAT_BURST_WINDOW)), CHAT_BURST_WINDOW)
+            self._chats[chatId] = limit
+        return limit
+
+    async def _wait(self, chatId):
+        start = time.monotonic()
+        self.queued += 1
+        try:
+            await self._resume.wait()
+            if chatId is not None:
+                await self._chatLimit(chatId).acquire()
+            await self._global.acquire()
+        finally:
+            self.queued -= 1
+        wait = time.monotonic() - start
+        self.sent += 1
+        self.totalWait += wait
+        self.maxWait = max(self.maxWait, wait)
+        if wait >= SLOW_WAIT:
+            logger.info(f"Message to chat {chatId} waited {wait:.1f}s in the outbound queue ({self.queued} still waiting)")
+        elif wait >= 0.5:
+            logger.debug(f"Message to chat {chatId} waited {wait:.2f}s in the outbound queue")
+        return wait
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chatId = data.get("chat_id")
+        try:
+            chatId = int(chatId)
+        except (TypeError, ValueError):
+            pass
+
+        paceChat = chatId if endpoint in CHAT_PACED_ENDPOINTS else None
+
+        maxRetries = rate_limit_args if rate_limit_args is not None else self.maxRetries
+        for attempt in range(maxRetries + 1):
+            try:
+                with tracing.span("telegram", endpoint) as details:
+                    details["waitMs"] = round(await self._wait(paceChat) * 1000, 1)
+                    if attempt:
+                        details["attempt"] = attempt + 1
+                    return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == maxRetries:
+                    logger.warning(f"Telegram flood limit hit for {endpoint}, giving up after {maxRetries} retries")
+                    raise
+                retryAfter = e.retry_after
+                retryAfter = retryAfter.total_seconds() if hasattr(retryAfter, "total_seconds") else float(retryAfter)
+                self.retries += 1
+                logger.info(f"Telegram flood limit hit for {endpoint}, retrying after {retryAfter}s")
+                # Hold back every request, not just this one, until Telegram accepts messages again
+                self._resume.clear()
+                try:
+                    await asyncio.sleep(retryAfter + 0.1)
+                finally:
+                    self._resume.set()
+
+    def stats(self):
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "retries": self.retries,
+            "averageWait": self.totalWait / self.sent if self.sent else 0.0,
+            "maxWait": self.maxWait,
+        }
+
+
+limiter = OutboundRateLimiter(
+    config.get("messagesPerSecond", 30),
+    config.get("messagesPerSecondPerChat", 1),
+    config.get("messagesPerMinutePerGroup", 20),
+    config.get("floodRetries", 3),
+)
+
+
+# Send the same text to many chats. The rate limiter paces the requests, so they can all be queued at once
+async def broadcast(bot, chatIds, text, **kwargs):
+    chatIds = list(chatIds)
+    results = await asyncio.gather(
+        *[bot.send_message(chat_id=chatId, text=text, **kwargs) for chatId in chatIds],
+        return_exceptions=True,
+    )
+    for chatId, result in zip(chatIds, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Could not send message to chat {chatId}: {result}")
+    return results
@@ -3,7 +3,7 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ConversationHandler, ContextTypes
 
 
-from commons import authentication, checkAllowed, checkId, generateServerAddr, clearUserData
+from commons import authentication, checkAllowed, checkId, generateServerAddr, clearUserData, requestTimeout
 from config import config
 from translations import i18n
 import logging
@@ -100,30 +100,34 @@ async def setClientSpeed(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     logger.debug('Sending request to qbittorrent')
     form_data = {"username": config["auth"]["username"], "password": config["auth"]["password"]}
-    session.post(url, data=form_data, headers=headers)
+    try:
+        session.post(url, data=form_data, headers=headers, timeout=requestTimeout())
+
+        toggle_url = generateServerAddr("qbittorrent") + "api/v2/transfer/toggleSpeedLimitsMode"
+
+        if choice == i18n.t("addarr.qBittorrent.Alternate"):
+            logger.debug("setting alternate mode in form data")
+            form_data = {"mode": 1}
+            toggle_response = session.post(toggle_url, headers=headers, data=form_data, timeout=requestTimeout())
+            logger.debug(f"Response from qbit: {toggle_response}")
+            if toggle_response.status_code == 200:
+                message = i18n.t("addarr.qBittorrent.ChangedToAlternate")
+            else:
+                message = i18n.t("addarr.qBittorrent.Error")
+
+        elif choice == i18n.t("addarr.qBittorrent.Normal"):
+            logger.debug("setting normal mode in form data")
+            form_data = {"mode": 0}
+            toggle_response = session.post(toggle_url, headers=headers, data=form_data, timeout=requestTimeout())
+            logger.debug(f"Response from qbit: {toggle_response}")
+            if toggle_response.status_code == 200:
+                message = i18n.t("addarr.qBittorrent.ChangedToNormal")
+            else:
+                message = i18n.t("addarr.qBittorrent.Error")
+    except requests.RequestException as e:
+        logger.warning(f"Could not reach qBittorrent: {e}")
+        message = i18n.t("addarr.qBittorrent.Error")
 
-    toggle_url = generateServerAddr("qbittorrent") + "api/v2/transfer/toggleSpeedLimitsMode"
-    
-    if choice == i18n.t("addarr.qBittorrent.Alternate"):
-        logger.debug("setting alternate mode in form data")
-        form_data = {"mode": 1}
-        toggle_response = session.post(toggle_url, headers=headers, data=form_data)
-        logger.debug(f"Response from qbit: {toggle_response}")
-        if toggle_response.status_code == 200:
-            message = i18n.t("addarr.qBittorrent.ChangedToAlternate")
-        else:
-            message = i18n.t("addarr.qBittorrent.Error")
-        
-    elif choice == i18n.t("addarr.qBittorrent.Normal"):
-        logger.debug("setting normal mode in form data")
-        form_data = {"mode": 0}
-        toggle_response = session.post(toggle_url, headers=headers, data=form_data)
-        logger.debug(f"Response from qbit: {toggle_response}")
-        if toggle_response.status_code == 200:
-            message = i18n.t("addarr.qBittorrent.ChangedToNormal")
-        else:
-            message = i18n.t("addarr.qBittorrent.Error")
-        
     await context.bot.edit_message_text(
             message_id=context.user_data["qbit_msg"],
             chat_id=update.effective_message.chat_id,
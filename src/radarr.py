@@ -1,11 +1,10 @@
 #!/usr/bin/env python3
 
-import json
 import logging
 
-import requests
-
-import commons as commons
+import cache
+import fastjson
+import library
 import logger
 from config import config
 
@@ -13,35 +12,23 @@ from config import config
 logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
 logger = logger.getLogger("addarr.radarr", logLevel, config.get("logToConsole", False))
 
-radarr_config = config["radarr"] if isinstance(config["radarr"]["instances"], list) else [config["radarr"]["instances"]]
-
 addMovieNeededFields = ["tmdbId", "year", "title", "titleSlug", "images"]
 
-def setInstance(label):
-    global radarr_config
-    radarr_instances = config['radarr']['instances']
-    commons.setInstanceName(label)
-
-    for instance in radarr_instances:
-        if instance["label"] == label:
-            radarr_config = instance
-            logger.info(f"Radarr instance set to: {label}")
-            return
-
-    logger.error(f"Radarr instance with label '{label}' not found. Default instace will be used.")
-
-def getInstance():
-    global radarr_config
-    return radarr_config
-
-def search(title):
-    parameters = {"term": title}
-    url = commons.generateApiQuery("radarr", "movie/lookup", parameters)
-    logger.info(url)
-    req = requests.get(url)
-    parsed_json = json.loads(req.text)
+async def search(client, title):
+    cacheKey = (client.app, client.label, cache.normalizeTerm(title))
+    parsed_json = cache.searchCache.get(cacheKey)
+    if parsed_json is None:
+        parameters = {"term": title}
+        logger.info(f"Searching Radarr for: {title}")
+        req = await client.get("movie/lookup", parameters)
+        if req.status_code != 200:
+            return False
+        parsed_json = fastjson.loads(req.content)
+        cache.searchCache.set(cacheKey, parsed_json)
+    else:
+        logger.debug(f"Search cache hit for: {title}")
 
-    if req.status_code == 200 and parsed_json:
+    if parsed_json:
         return parsed_json
     else:
         return False
@@ -60,50 +47,53 @@ def giveTitles(parsed_json):
                     "poster": movie.get("remotePoster", None),
                     "year": movie["year"],
                     "id": movie["tmdbId"],
+                    "lookup": movie,
                 }
             )
     return data
 
 
-def inLibrary(tmdbId):
-    parameters = {}
-    req = requests.get(commons.generateApiQuery("radarr", "movie", parameters))
-    parsed_json = json.loads(req.text)
-    return next((True for movie in parsed_json if movie["tmdbId"] == tmdbId), False)
+async def inLibrary(client, tmdbId):
+    return await library.getIndex(client).contains(tmdbId)
 
 
-def addToLibrary(tmdbId, path, qualityProfileId, tags):
-    parameters = {"tmdbId": str(tmdbId)}
-    req = requests.get(
-        commons.generateApiQuery("radarr", "movie/lookup/tmdb", parameters)
-    )
-    parsed_json = json.loads(req.text)
-    data = json.dumps(buildData(parsed_json, path, qualityProfileId, tags))
-    add = requests.post(commons.generateApiQuery("radarr", "movie"), data=data, headers={'Content-Type': 'application/json'})
+async def addToLibrary(client, tmdbId, path, qualityProfileId, tags, lookup=None):
+    # The record picked from the search results already has everything needed for the POST
+    if lookup is None:
+        parameters = {"tmdbId": str(tmdbId)}
+        req = await client.get("movie/lookup/tmdb", parameters)
+        lookup = fastjson.loads(req.content)
+    data = buildData(client, lookup, path, qualityProfileId, tags)
+    add = await client.post("movie", data)
     if add.status_code == 201:
+        library.getIndex(client).add(fastjson.loads(add.content))
         return True
     else:
         return False
 
 
-def removeFromLibrary(tmdbId):
+async def removeFromLibrary(client, tmdbId):
     parameters = { 
         "deleteFiles": str(True)
     }
-    dbId = getDbIdFromImdbId(tmdbId)
-    delete = requests.delete(commons.generateApiQuery("radarr", f"movie/{dbId}", parameters))
+    dbId = await getDbIdFromImdbId(client, tmdbId)
+    if not dbId:
+        logger.debug(f"{tmdbId} is not in the library of {client.label}")
+        return False
+    delete = await client.delete(f"movie/{dbId}", parameters)
     if delete.status_code == 200:
+        library.getIndex(client).remove(tmdbId)
         return True
     else:
         return False
 
 
-def buildData(json, path, qualityProfileId, tags):
+def buildData(client, json, path, qualityProfileId, tags):
     built_data = {
         "qualityProfileId": int(qualityProfileId),
-        "minimumAvailability": radarr_config["minimumAvailability"],
+        "minimumAvailability": client.config["minimumAvailability"],
         "rootFolderPath": path,
-        "addOptions": {"searchForMovie": radarr_config["search"]},
+        "addOptions": {"searchForMovie": client.config["search"]},
         "tags": tags,
     }
 
@@ -112,101 +102,71 @@ def buildData(json, path, qualityProfileId, tags):
     return built_data
 
 
-def getRootFolders():
-    parameters = {}
-    req = requests.get(commons.generateApiQuery("radarr", "Rootfolder", parameters))
-    parsed_json = json.loads(req.text)
-    return parsed_json
-
-
-def getAllMedia():
-    parameters = {}
-    req = requests.get(commons.generateApiQuery("radarr", "movie", parameters))
-    parsed_json = json.loads(req.text)
-
-    if req.status_code == 200:
-        data = []
-        for movie in parsed_json:
-            if all(
-                x in movie
-                for x in ["title", "year", "monitored", "status"]
-            ):
-                data.append(
-                    {
-                        "title": movie["title"],
-                        "year": movie["year"],
-                        "monitored": movie["monitored"],
-                        "status": movie["status"]
-                    }
-                )
-        return data
-    else:
-        return False
+async def getRootFolders(client):
+    return await cache.getMetadata(client, "Rootfolder")
 
 
-def getQualityProfiles():
-    parameters = {}
-    req = requests.get(commons.generateApiQuery("radarr", "qualityProfile", parameters))
-    parsed_json = json.loads(req.text)
-    return parsed_json
+async def getQualityProfiles(client):
+    return await cache.getMetadata(client, "qualityProfile")
 
 
-def getTags():
-    parameters = {}
-    req = requests.get(commons.generateApiQuery("radarr", "tag", parameters))
-    parsed_json = json.loads(req.text)
-    return parsed_json
+async def getTags(client):
+    return await cache.getMetadata(client, "tag")
     
-def createTag(tag):
+async def createTag(client, tag):
     data_json = {
         "label": str(tag)
     }
-    add = requests.post(commons.generateApiQuery("radarr", "tag"), json=data_json, headers={'Content-Type': 'application/json'})
-    response_content = json.loads(add.content.decode('utf-8'))
+    add = await client.post("tag", data_json)
+    response_content = fastjson.loads(add.content)
+    # Force the next getTags() to fetch the list including the new tag
+    cache.metadataCache.pop((client.app, client.label, "tag"))
     if add.status_code == 200 or add.status_code == 201:
         return response_content["id"]
     else:
         return -1
 
-def tagExists(tag):
-    tags = getTags()
+async def tagExists(client, tag):
+    tags = await getTags(client)
     for item in tags:
         if item['label'] == str(tag).lower():
             return item['id']
     return -1
     
 
-def getDbIdFromImdbId(tmdbId):
-    req = requests.get(commons.generateApiQuery("radarr", "movie", {}))
-    parsed_json = json.loads(req.text)
-    dbId = [f["id"] for f in parsed_json if f["tmdbId"] == tmdbId]
-    return dbId[0]
-
-def notificationProfileExist(chatid):
-    # check if profile exists
-    profiles = requests.get(commons.generateApiQuery("radarr", "notification"))
-    response_content = json.loads(profiles.content.decode('utf-8'))
+async def getDbIdFromImdbId(client, tmdbId):
+    index = library.getIndex(client)
+    item = await index.get(tmdbId)
+    if item is None:
+        # Added or removed outside of Addarr since the index was built
+        await index.refresh()
+        item = await index.get(tmdbId)
+    return item.dbId if item is not None else False
+
+async def notificationProfileExist(client, chatid):
+    # check if profile exists. The listing is cached, so one /notify run fetches it once per instance
+    response_content = await cache.getMetadata(client, "notification")
     profileExists = any(str(chatid) in item['name'] for item in response_content)
     if profileExists: 
-        label = getInstance()["label"]
+        label = client.label
         logger.debug(f'Notification Profile for user {chatid} already exists in instance {label}')
         return True
     else:
         return False
 
-def createNotificationProfile(profileName, chatid):
+async def createNotificationProfile(client, profileName, chatid):
     bot_token = config["telegram"]["token"]
     # check if user tag exists
     logger.debug(f'Check if user tag exists: {chatid}')
-    tag_id = tagExists(chatid)
+    tag_id = await tagExists(client, chatid)
 
     if tag_id is None or tag_id == -1:
         # create the tag first
         logger.debug(f'Creating user tag: {chatid}')
-        tag_id = createTag(chatid)
+        tag_id = await createTag(client, chatid)
         logger.debug(f'Tag created with ID: {tag_id}')
 
-    if notificationProfileExist(chatid):
+    if await notificationProfileExist(client, chatid):
         return True
 
     data_json = {
@@ -300,12 +260,8 @@ def createNotificationProfile(profileName, chatid):
             "includeHealthWarnings": False
     }
 
-    headers = {
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
-    }
-    
-    add = requests.post(commons.generateApiQuery("radarr", "notification"), json=data_json, headers=headers)
+    add = await client.post("notification", data_json)
+    cache.metadataCache.pop((client.app, client.label, "notification"))
 
     if add.status_code == 201:
         return True
@@ -2,7 +2,7 @@ import requests
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ConversationHandler
 
-from commons import authentication, checkAllowed, checkId, generateApiQuery
+from commons import authentication, checkAllowed, checkId, generateApiQuery, requestTimeout
 from config import config
 from translations import i18n
 import logging
@@ -76,9 +76,13 @@ async def changeSpeedSabnzbd(update, context):
     url = generateApiQuery("sabnzbd", "",
                            {'output': 'json', 'mode': 'config', 'name': 'speedlimit', 'value': choice})
 
-    req = requests.get(url)
+    try:
+        req = requests.get(url, timeout=requestTimeout())
+    except requests.RequestException as e:
+        logger.warning(f"Could not reach SABnzbd: {e}")
+        req = None
     message = None
-    if req.status_code == 200:
+    if req is not None and req.status_code == 200:
         if choice == SABNZBD_SPEED_LIMIT_100:
             message = i18n.t("addarr.Sabnzbd.ChangedTo100")
         elif choice == SABNZBD_SPEED_LIMIT_50:
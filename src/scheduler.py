@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+import logger
+from config import config
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.scheduler", logLevel, config.get("logToConsole", False))
+
+# Upper bound for updates PTB hands to the processor at once. The real limit is applied per chat
+# below, so a chat with a backlog waits on its own lock without holding one of the worker slots.
+MAX_PENDING_UPDATES = 4096
+
+
+# Processes updates of different chats in parallel, while updates of the same chat keep their order.
+# ConversationHandler relies on seeing the updates of one conversation one by one, which this guarantees.
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates):
+        super().__init__(MAX_PENDING_UPDATES)
+        self.workers = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._chatLocks = {}
+        self._pending = {}
+
+    async def do_process_update(self, update, coroutine):
+        chatId = None
+        if isinstance(update, Update) and update.effective_chat is not None:
+            chatId = update.effective_chat.id
+
+        if chatId is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        lock = self._chatLocks.setdefault(chatId, asyncio.Lock())
+        self._pending[chatId] = self._pending.get(chatId, 0) + 1
+        try:
+            async with lock:
+                async with self._slots:
+                    await coroutine
+        finally:
+            self._pending[chatId] -= 1
+            if not self._pending[chatId]:
+                del self._pending[chatId]
+                del self._chatLocks[chatId]
+
+    async def initialize(self):
+        logger.debug(f"Processing updates of up to {self.workers} chats concurrently")
+
+    async def shutdown(self):
+        pass
@@ -1,11 +1,10 @@
 #!/usr/bin/env python3
 
-import json
 import logging
 
-import requests
-
-import commons as commons
+import cache
+import fastjson
+import library
 import logger
 from config import config
 
@@ -13,33 +12,22 @@ from config import config
 logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
 logger = logger.getLogger("addarr.sonarr", logLevel, config.get("logToConsole", False))
 
-sonarr_config = config["sonarr"] if isinstance(config["sonarr"]["instances"], list) else [config["sonarr"]["instances"]]
-
 addSerieNeededFields = ["tvdbId", "tvRageId", "title", "titleSlug", "images", "seasons"]
 
-def setInstance(label):
-    global sonarr_config
-    sonarr_instances = config['sonarr']['instances']
-    commons.setInstanceName(label)
-
-    for instance in sonarr_instances:
-        if instance["label"] == label:
-            sonarr_config = instance
-            logger.info(f"Sonarr instance set to: {label}")
-            return
-
-    logger.error(f"Sonarr instance with label '{label}' not found. Default instance will be used.")
-
-def getInstance():
-    global sonarr_config
-    return sonarr_config
-
-def search(title):
-    parameters = {"term": title}
-    req = requests.get(commons.generateApiQuery("sonarr", "series/lookup", parameters))
-    parsed_json = json.loads(req.text)
+async def search(client, title):
+    cacheKey = (client.app, client.label, cache.normalizeTerm(title))
+    parsed_json = cache.searchCache.get(cacheKey)
+    if parsed_json is None:
+        parameters = {"term": title}
+        req = await client.get("series/lookup", parameters)
+        if req.status_code != 200:
+            return False
+        parsed_json = fastjson.loads(req.content)
+        cache.searchCache.set(cacheKey, parsed_json)
+    else:
+        logger.debug(f"Search cache hit for: {title}")
 
-    if req.status_code == 200 and parsed_json:
+    if parsed_json:
         return parsed_json
     else:
         return False
@@ -61,52 +49,59 @@ def giveTitles(parsed_json):
                     "id": show["tvdbId"],
                     "monitored": show["monitored"],
                     "status": show["status"],
+                    "lookup": show,
                 }
             )
     return data
 
 
-def inLibrary(tvdbId):
-    parameters = {}
-    req = requests.get(commons.generateApiQuery("sonarr", "series", parameters))
-    parsed_json = json.loads(req.text)
-    return next((True for show in parsed_json if show["tvdbId"] == tvdbId), False)
+async def inLibrary(client, tvdbId):
+    return await library.getIndex(client).contains(tvdbId)
 
 
-def addToLibrary(tvdbId, path, qualityProfileId, tags, seasonsSelected):
-    parameters = {"term": "tvdb:" + str(tvdbId)}
-    req = requests.get(commons.generateApiQuery("sonarr", "series/lookup", parameters))
-    parsed_json = json.loads(req.text)
-    data = json.dumps(buildData(parsed_json, path, qualityProfileId, tags, seasonsSelected))
-    add = requests.post(commons.generateApiQuery("sonarr", "series"), data=data, headers={'Content-Type': 'application/json'})
+async def addToLibrary(client, tvdbId, path, qualityProfileId, tags, seasonsSelected, lookup=None):
+    # The record picked from the search results already has everything needed for the POST
+    if lookup is None:
+        parameters = {"term": "tvdb:" + str(tvdbId)}
+        req = await client.get("series/lookup", parameters)
+        parsed_json = fastjson.loads(req.content)
+    else:
+        parsed_json = [lookup]
+    data = buildData(client, parsed_json, path, qualityProfileId, tags, seasonsSelected)
+    add = await client.post("series", data)
     if add.status_code == 201:
+        library.getIndex(client).add(fastjson.loads(add.content))
         return True
     else:
         return False
 
 
-def removeFromLibrary(tvdbId):
+async def removeFromLibrary(client, tvdbId):
     parameters = { 
         "deleteFiles": str(True)
     }
-    dbId = getDbIdFromImdbId(tvdbId)
-    delete = requests.delete(commons.generateApiQuery("sonarr", f"series/{dbId}", parameters))
+    dbId = await getDbIdFromImdbId(client, tvdbId)
+    if not dbId:
+        logger.debug(f"{tvdbId} is not in the library of {client.label}")
+        return False
+    delete = await client.delete(f"series/{dbId}", parameters)
     if delete.status_code == 200:
+        library.getIndex(client).remove(tvdbId)
         return True
     else:
         return False
 
 
-def buildData(json, path, qualityProfileId, tags, seasonsSelected):
+def buildData(client, json, path, qualityProfileId, tags, seasonsSelected):
     built_data = {
         "qualityProfileId": qualityProfileId,
         "addOptions": {
             "ignoreEpisodesWithFiles": True,
             "ignoreEpisodesWithoutFiles": False,
-            "searchForMissingEpisodes": sonarr_config["search"],
+            "searchForMissingEpisodes": client.config["search"],
         },
         "rootFolderPath": path,
-        "seasonFolder": sonarr_config["seasonFolder"],
+        "seasonFolder": client.config["seasonFolder"],
         "monitored": True,
         "tags": tags,
         "seasons": seasonsSelected,
@@ -116,14 +111,11 @@ def buildData(json, path, qualityProfileId, tags, seasonsSelected):
             if key in addSerieNeededFields:
                 built_data[key] = value
             if key == "seasons": built_data["seasons"] = seasonsSelected
-    logger.debug(f"Query endpoint is: {commons.generateApiQuery('sonarr', 'series')}")
     return built_data
 
 
-def getRootFolders():
-    parameters = {}
-    req = requests.get(commons.generateApiQuery("sonarr", "Rootfolder", parameters))
-    parsed_json = json.loads(req.text)
+async def getRootFolders(client):
+    parsed_json = await cache.getMetadata(client, "Rootfolder")
     # Remove unmappedFolders from rootFolder data--we don't need that
     for item in [
         item for item in parsed_json if item.get("unmappedFolders") is not None
@@ -132,101 +124,76 @@ def getRootFolders():
     return parsed_json
 
 
-def getAllMedia():
-    parameters = {}
-    req = requests.get(commons.generateApiQuery("sonarr", "series", parameters))
-    parsed_json = json.loads(req.text)
-
-    if req.status_code == 200:
-        data = []
-        for show in parsed_json:
-            if all(
-                x in show
-                for x in ["title", "year", "monitored", "status"]
-            ):
-                data.append(
-                    {
-                        "title": show["title"],
-                        "year": show["year"],
-                        "monitored": show["monitored"],
-                        "status": show["status"],
-                    }
-                )
-        return data
-    else:
-        return False
+async def getQualityProfiles(client):
+    return await cache.getMetadata(client, "qualityProfile")
 
 
-def getQualityProfiles():
-    parameters = {}
-    req = requests.get(commons.generateApiQuery("sonarr", "qualityProfile", parameters))
-    parsed_json = json.loads(req.text)
-    return parsed_json
+async def getTags(client):
+    return await cache.getMetadata(client, "tag")
 
-
-def getTags():
-    parameters = {}
-    req = requests.get(commons.generateApiQuery("sonarr", "tag", parameters))
-    parsed_json = json.loads(req.text)
-    return parsed_json
-
-def createTag(tag):
+async def createTag(client, tag):
     data_json = {
         "label": str(tag)
     }
-    add = requests.post(commons.generateApiQuery("sonarr", "tag"), json=data_json, headers={'Content-Type': 'application/json'})
-    response_content = json.loads(add.content.decode('utf-8'))
+    add = await client.post("tag", data_json)
+    response_content = fastjson.loads(add.content)
+    # Force the next getTags() to fetch the list including the new tag
+    cache.metadataCache.pop((client.app, client.label, "tag"))
     if add.status_code == 200 or add.status_code == 201:
         return response_content["id"]
     else:
         return -1
     
-def tagExists(tag):
-    tags = getTags()
+async def tagExists(client, tag):
+    tags = await getTags(client)
     for item in tags:
         if item['label'] == str(tag).lower():
             return item['id']
     return -1
 
-def getSeasons(tvdbId):
+async def getSeasons(client, tvdbId, lookup=None):
+    if lookup is not None and "seasons" in lookup:
+        return lookup["seasons"]
     parameters = {"term": "tvdb:" + str(tvdbId)}
-    req = requests.get(commons.generateApiQuery("sonarr", "series/lookup", parameters))
-    parsed_json = json.loads(req.text)
+    req = await client.get("series/lookup", parameters)
+    parsed_json = fastjson.loads(req.content)
     return parsed_json[0]["seasons"]
 
 
-def getDbIdFromImdbId(tvdbId):
-    req = requests.get(commons.generateApiQuery("sonarr", "series", {}))
-    parsed_json = json.loads(req.text)
-    dbId = [f["id"] for f in parsed_json if f["tvdbId"] == tvdbId]
-    return dbId[0]
+async def getDbIdFromImdbId(client, tvdbId):
+    index = library.getIndex(client)
+    item = await index.get(tvdbId)
+    if item is None:
+        # Added or removed outside of Addarr since the index was built
+        await index.refresh()
+        item = await index.get(tvdbId)
+    return item.dbId if item is not None else False
 
-def notificationProfileExist(chatid):
-    # check if profile exists
-    profiles = requests.get(commons.generateApiQuery("sonarr", "notification"))
-    response_content = json.loads(profiles.content.decode('utf-8'))
+async def notificationProfileExist(client, chatid):
+    # check if profile exists. The listing is cached, so one /notify run fetches it once per instance
+    response_content = await cache.getMetadata(client, "notification")
     profileExists = any(str(chatid) in item['name'] for item in response_content)
     if profileExists: 
-        label = getInstance()["label"]
+        label = client.label
         logger.debug(f'Notification Profile for user {chatid} already exists in instance {label}')
         return True
     else:
         return False
     
 
-def createNotificationProfile(profileName, chatid):
+async def createNotificationProfile(client, profileName, chatid):
     bot_token = config["telegram"]["token"]
     # check if user tag exists
     logger.debug(f'Check if user tag exists: {chatid}')
-    tag_id = tagExists(chatid)
+    tag_id = await tagExists(client, chatid)
 
     if tag_id is None or tag_id == -1:
         # create the tag first
         logger.debug(f'Creating user tag: {chatid}')
-        tag_id = createTag(chatid)
+        tag_id = await createTag(client, chatid)
         logger.debug(f'Tag created with ID: {tag_id}')
 
-    if notificationProfileExist(chatid):
+    if await notificationProfileExist(client, chatid):
         return True
     
     data_json = {
@@ -320,13 +287,8 @@ def createNotificationProfile(profileName, chatid):
         "includeHealthWarnings": False
     }
 
-    headers = {
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
-    }
-
-
-    add = requests.post(commons.generateApiQuery("sonarr", "notification"), json=data_json, headers=headers)
+    add = await client.post("notification", data_json)
+    cache.metadataCache.pop((client.app, client.label, "notification"))
 
     if add.status_code == 201:
         return True
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import sqlite3
+import time
+
+import logger
+from config import config
+from definitions import CHATID_PATH, NOTIFICATIONLIST_PATH, STATE_DB_PATH
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.statestore", logLevel, config.get("logToConsole", False))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (chat_id TEXT PRIMARY KEY, name TEXT, added_at REAL);
+CREATE TABLE IF NOT EXISTS notifications (chat_id TEXT PRIMARY KEY, name TEXT, added_at REAL);
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL,
+    username TEXT,
+    app TEXT,
+    instance TEXT,
+    external_id INTEGER,
+    title TEXT,
+    result TEXT,
+    requested_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_by_chat ON requests (chat_id, requested_at);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Text files that are imported once into their table, the first time the database is opened
+MIGRATIONS = {
+    "chats": CHATID_PATH,
+    "notifications": NOTIFICATIONLIST_PATH,
+}
+
+_db = None
+
+
+def parseLine(line):
+    key, _, name = line.strip().partition(" - ")
+    return key.strip(), name.strip() or None
+
+
+def getDb():
+    global _db
+    if _db is None:
+        os.makedirs(os.path.dirname(STATE_DB_PATH), exist_ok=True)
+        # All handlers run on the event loop thread, so one connection is shared.
+        # WAL lets readers continue while a write is committed.
+        _db = sqlite3.connect(STATE_DB_PATH, isolation_level=None, check_same_thread=False)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute("PRAGMA synchronous=NORMAL")
+        _db.executescript(SCHEMA)
+        migrate(_db)
+    return _db
+
+
+def migrate(db):
+    for table, path in MIGRATIONS.items():
+        key = f"migrated:{table}"
+        if db.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            continue
+        rows = []
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                rows = [parseLine(line) for line in file if line.strip()]
+        with db:
+            db.execute("BEGIN")
+            db.executemany(
+                f"INSERT OR IGNORE INTO {table} (chat_id, name, added_at) VALUES (?, ?, ?)",
+                [(chatId, name, time.time()) for chatId, name in rows],
+            )
+            db.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, path))
+        if rows:
+            logger.info(f"Migrated {len(rows)} entries from {path} into the {table} table")
+
+
+def close():
+    global _db
+    if _db is not None:
+        _db.close()
+        _db = None
+
+
+def addChat(table, chatId, name=None):
+    getDb().execute(
+        f"INSERT OR REPLACE INTO {table} (chat_id, name, added_at) VALUES (?, ?, ?)",
+        (str(chatId), name, time.time()),
+    )
+
+
+def getChats(table):
+    return [row[0] for row in getDb().execute(f"SELECT chat_id FROM {table} ORDER BY added_at")]
+
+
+# The request log is only written by the bot, it is read with any SQLite client (see the README)
+def logRequest(chatId, username, app, instance, externalId, title, result):
+    getDb().execute(
+        "INSERT INTO requests (chat_id, username, app, instance, external_id, title, result, requested_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (str(chatId), username, app, instance, externalId, title, result, time.time()),
+    )
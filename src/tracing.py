@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import contextlib
+import contextvars
+import functools
+import logging
+import logging.handlers
+import os
+import time
+import uuid
+
+import fastjson
+import logger
+from config import config
+from definitions import TRACE_LOG_PATH
+
+# Set up logging
+logLevel = logging.DEBUG if config.get("debugLogging", False) else logging.INFO
+logger = logger.getLogger("addarr.tracing", logLevel, config.get("logToConsole", False))
+
+# The trace of the update being handled. Tasks started while handling it (e.g. one search per instance)
+# copy the context, so their spans end up in the same trace
+_current = contextvars.ContextVar("trace", default=None)
+_traceLog = None
+
+
+class Trace:
+    def __init__(self, update, handler):
+        self.id = uuid.uuid4().hex[:16]
+        self.handler = handler
+        self.updateId = getattr(update, "update_id", None)
+        chat = getattr(update, "effective_chat", None)
+        self.chatId = chat.id if chat is not None else None
+        self.startedAt = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def toDict(self, duration, error=None):
+        return {
+            "trace": self.id,
+            "update": self.updateId,
+            "chat": self.chatId,
+            "handler": self.handler,
+            "startedAt": round(self.startedAt, 3),
+            "ms": round(duration * 1000, 1),
+            "error": error,
+            "spans": sorted(self.spans, key=lambda span: span["at"]),
+        }
+
+
+# Records how long the block takes in the trace of the current update, if there is one.
+# Yields a dict, anything added to it while the block runs is stored with the span
+@contextlib.contextmanager
+def span(kind, name, **attributes):
+    trace = _current.get()
+    if trace is None:
+        yield attributes
+        return
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        trace.spans.append(dict(
+            kind=kind,
+            name=name,
+            at=round((start - trace.start) * 1000, 1),
+            ms=round((time.perf_counter() - start) * 1000, 1),
+            **attributes,
+        ))
+
+
+def _getTraceLog():
+    global _traceLog
+    if _traceLog is None:
+        # Not a child of the addarr logger, so traces stay out of addarr.log
+        _traceLog = logging.getLogger("addarr-traces")
+        _traceLog.setLevel(logging.INFO)
+        _traceLog.propagate = False
+        os.makedirs(os.path.dirname(TRACE_LOG_PATH), exist_ok=True)
+        fileHandler = logging.handlers.TimedRotatingFileHandler(
+            TRACE_LOG_PATH, when="midnight", interval=1, backupCount=7,
+        )
+        fileHandler.setFormatter(logging.Formatter("%(message)s"))
+        _traceLog.addHandler(fileHandler)
+    return _traceLog
+
+
+def _finish(trace, error):
+    duration = time.perf_counter() - trace.start
+    threshold = config["tracing"]["slowThreshold"]
+    if duration < threshold:
+        return
+    logger.info(f"Update {trace.updateId} ({trace.handler}) took {duration:.2f}s, see trace {trace.id}")
+    _getTraceLog().info(fastjson.dumps(trace.toDict(duration, error)).decode("utf-8"))
+
+
+# Wraps a handler callback. The first wrapped callback that handles an update starts its trace,
+# and every wrapped callback adds a span for itself. Returns the callback unchanged when tracing is off
+def traced(callback):
+    if not config["tracing"].get("enable") or getattr(callback, "_traced", False):
+        return callback
+    name = getattr(callback, "__name__", repr(callback))
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        if _current.get() is not None:
+            with span("handler", name):
+                return await callback(update, context)
+
+        trace = Trace(update, name)
+        token = _current.set(trace)
+        error = None
+        try:
+            with span("handler", name):
+                return await callback(update, context)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            _finish(trace, error)
+
+    wrapper._traced = True
+    return wrapper
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# Sends every export format through Bot.send_document, the way /allMovies and /allSeries do.
+# Telegram is replaced by a request class that records the upload, nothing leaves the machine.
+# Needs a config.yaml like the bot itself.
+#
+#   python -m pytest tests
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+import pytest
+from telegram import Bot
+from telegram.request import BaseRequest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import export  # noqa: E402
+import library  # noqa: E402
+
+ITEMS = [
+    library.MediaItem(1001, 1, "Title, with a comma", 2001, True, "released"),
+    library.MediaItem(1002, 2, "Заголовок", 2002, False, "announced"),
+]
+
+
+class RecordingRequest(BaseRequest):
+    def __init__(self):
+        self.uploads = []
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        if url.endswith("/getMe"):
+            result = {"id": 1, "is_bot": True, "first_name": "Addarr", "username": "addarr_bot"}
+        else:
+            self.uploads.append(request_data.multipart_data["document"])
+            result = {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": 42, "type": "private"},
+                "document": {"file_id": "file", "file_unique_id": "file"},
+            }
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+
+async def sendExport(exportFormat):
+    request = RecordingRequest()
+    async with Bot("123:abc", request=request, get_updates_request=RecordingRequest()) as bot:
+        await bot.send_document(
+            chat_id=42,
+            document=export.writeExport(ITEMS, exportFormat),
+            filename=f"movies.{export.EXPORT_FORMATS[exportFormat]}",
+        )
+    return request.uploads[0]
+
+
+@pytest.mark.parametrize("exportFormat", list(export.EXPORT_FORMATS))
+def test_send_export(exportFormat):
+    filename, content, _ = asyncio.run(sendExport(exportFormat))
+    assert filename == f"movies.{export.EXPORT_FORMATS[exportFormat]}"
+
+    if exportFormat.endswith("gz"):
+        content = gzip.decompress(content)
+    text = content.decode("utf-8")
+    if exportFormat.startswith("csv"):
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        rows = [json.loads(line) for line in text.splitlines()]
+    assert [row["title"] for row in rows] == [item.title for item in ITEMS]